@@ -1,539 +1,527 @@
-import streamlit as st
-import pandas as pd
-import json
-import requests
-import time
-import os
-import io
-from isbnlib import is_isbn10, is_isbn13, to_isbn13
-from threading import Thread
-
-# Configurar título y descripción de la página
-st.set_page_config(page_title="Procesador de ISBNs", page_icon="📚", layout="wide")
-st.title("Procesador de ISBNs")
-
-# Crear directorios si no existen
-os.makedirs('uploads', exist_ok=True)
-os.makedirs('downloads', exist_ok=True)
-JSON_FILE = 'isbn_index.json'
-
-# Creación de un estado compartido para seguimiento
-if 'processing_complete' not in st.session_state:
-    st.session_state.processing_complete = False
-if 'current_stats' not in st.session_state:
-    st.session_state.current_stats = {"total": 0, "from_cache": 0, "from_api": 0, "not_found": 0, "pending": 0}
-if 'isbn_count' not in st.session_state:
-    st.session_state.isbn_count = 0
-if 'needs_update' not in st.session_state:
-    st.session_state.needs_update = False
-
-# Función para buscar ISBN en API
-def fetch_isbn_date_from_api(isbn):
-    # Convertir cualquier ISBN-10 a ISBN-13 para consistencia
-    if is_isbn10(isbn):
-        isbn = to_isbn13(isbn)
-    
-    # Intentamos primero con Google Books API
-    url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-    
-    try:
-        # Aumentado el timeout de 5 a 15 segundos
-        response = requests.get(url, timeout=15)
-        data = response.json()
-        
-        # Si encontramos resultados
-        if data.get('totalItems', 0) > 0:
-            published_date = data['items'][0]['volumeInfo'].get('publishedDate', 'Desconocido')
-            # Formateamos como YYYY o DD-MM-YY según la longitud
-            if len(published_date) == 4:  # Solo año
-                return published_date, True
-            elif len(published_date) >= 10:  # Fecha completa
-                date_parts = published_date.split('-')
-                if len(date_parts) >= 3:
-                    return f"{date_parts[2][:2]}-{date_parts[1]}-{date_parts[0][2:]}", True
-            return published_date, True
-    except Exception as e:
-        # Si falla Google Books, no mostramos el error inmediatamente
-        # sino que continuamos con OpenLibrary
-        pass
-    
-    # Si no hay resultados con Google Books, intentamos con Open Library
-    try:
-        url_ol = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
-        # Aumentado el timeout a 20 segundos
-        response_ol = requests.get(url_ol, timeout=20)
-        data_ol = response_ol.json()
-        
-        if f"ISBN:{isbn}" in data_ol:
-            publish_date = data_ol[f"ISBN:{isbn}"].get("publish_date", "Desconocido")
-            # Intentamos formatear la fecha si es posible
-            try:
-                if len(publish_date) == 4:  # Solo año
-                    return publish_date, True
-                return publish_date, True
-            except:
-                return publish_date, True
-    except Exception as e:
-        st.error(f"Error al buscar ISBN {isbn}: {e}")
-    
-    return "No encontrado", False  # Si no se encuentra en ninguna API
-
-def process_excel_with_isbns(df, progress_bar=None, status_container=None, status_placeholder=None):
-    # Cargar el índice existente de ISBNs
-    isbn_index = {}
-    if os.path.exists(JSON_FILE):
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
-            try:
-                isbn_index = json.load(f)
-            except json.JSONDecodeError:
-                isbn_index = {}
-    
-    # Verificar que hay al menos una columna
-    if df.shape[1] == 0:
-        st.error("El archivo Excel no tiene columnas.")
-        return None, None, None
-    
-    # Asegurarnos de que la primera columna sea tratada como texto
-    # Preservamos la columna original para mantener el formato
-    original_col_name = df.columns[0]
-    df[original_col_name] = df[original_col_name].astype(str)
-    
-    # Extraer los ISBNs de la primera columna
-    isbns = df.iloc[:, 0].astype(str).str.strip()
-    
-    # Crear una nueva columna para las fechas de lanzamiento
-    release_dates = []
-    new_isbns_added = 0
-    
-    # Calcular estadísticas iniciales
-    total_isbns = len(isbns)
-    isbns_in_cache = sum(1 for isbn in isbns if ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x') in isbn_index)
-    isbns_to_search = total_isbns - isbns_in_cache
-    
-    stats = {
-        "total": total_isbns, 
-        "from_cache": 0, 
-        "from_api": 0, 
-        "not_found": 0, 
-        "pending": isbns_to_search
-    }
-    
-    # Actualizar el estado de sesión con las estadísticas actuales
-    st.session_state.current_stats = stats.copy()
-    
-    # Mostrar estadísticas iniciales
-    if status_container:
-        status_container.text(f"Total de ISBNs a procesar: {stats['total']}")
-        status_container.text(f"ISBNs en base de datos: {isbns_in_cache}")
-        status_container.text(f"ISBNs pendientes de buscar en API: {isbns_to_search}")
-    
-    # Lista para almacenar mensajes
-    messages = []
-    
-    # Procesar cada ISBN
-    for i, isbn in enumerate(isbns):
-        # Actualizar la barra de progreso si se proporciona
-        if progress_bar is not None:
-            progress_bar.progress((i + 1) / len(isbns))
-        
-        # Limpiar ISBN de caracteres no numéricos si es necesario
-        isbn_clean = ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x')
-        
-        # Si el ISBN está en el índice, usar la fecha almacenada
-        if isbn_clean in isbn_index:
-            release_dates.append(isbn_index[isbn_clean])
-            stats["from_cache"] += 1
-            
-            # Añadir mensaje neutral (sin formato de éxito) para ISBNs en caché
-            messages.append(f"ISBN {isbn_clean} encontrado en caché: {isbn_index[isbn_clean]}")
-        else:
-            # Si no está en el índice, buscar en la API
-            messages.append(f"🔍 Buscando fecha para ISBN {isbn_clean} en API...")
-            
-            date, found = fetch_isbn_date_from_api(isbn_clean)
-            
-            # Almacenar el resultado en el índice
-            if found:
-                isbn_index[isbn_clean] = date
-                new_isbns_added += 1
-                stats["from_api"] += 1
-                messages.append(f"ISBN {isbn_clean} resultado: {date}")
-                
-                # Guardar cada 2 ISBN añadido para no perder progreso
-                if new_isbns_added % 2 == 0:
-                    with open(JSON_FILE, 'w', encoding='utf-8') as f:
-                        json.dump(isbn_index, f, indent=2, ensure_ascii=False)
-                    
-                    # Actualizar contador de ISBNs en la sesión
-                    st.session_state.isbn_count = len(isbn_index)
-                    st.session_state.needs_update = True
-            else:
-                stats["not_found"] += 1
-                messages.append(f"ISBN {isbn_clean} no encontrado")
-            
-            stats["pending"] -= 1
-            release_dates.append(date)
-            
-            # Actualizar las estadísticas en el estado de la sesión
-            st.session_state.current_stats = stats.copy()
-            
-            # Actualizar estadísticas en tiempo real y mostrar mensajes
-            if status_placeholder:
-                status_text = (
-                    f"Total de ISBNs a procesar: {stats['total']}\n"
-                    f"ISBNs en base de datos: {isbns_in_cache}\n"
-                    f"ISBNs encontrados en caché: {stats['from_cache']}\n"
-                    f"ISBNs encontrados en API: {stats['from_api']}\n"
-                    f"ISBNs no encontrados: {stats['not_found']}\n"
-                    f"ISBNs pendientes: {stats['pending']}\n\n"
-                )
-                
-                # Mostrar los últimos 10 mensajes
-                status_text += "\n".join(messages[-10:])
-                status_placeholder.text(status_text)
-            
-            # Esperar un breve tiempo para no sobrecargar la API
-            time.sleep(0.5)
-    
-    # Añadir la columna de fechas al DataFrame
-    df['Fecha de Lanzamiento'] = release_dates
-    
-    # Actualizar el archivo JSON con los nuevos ISBNs encontrados
-    if new_isbns_added > 0:
-        with open(JSON_FILE, 'w', encoding='utf-8') as f:
-            json.dump(isbn_index, f, indent=2, ensure_ascii=False)
-        
-        # Actualizar contador final de ISBNs
-        st.session_state.isbn_count = len(isbn_index)
-    
-    # Marcar como completado
-    st.session_state.processing_complete = True
-    
-    return df, stats, messages
-
-# Función auxiliar para procesar en segundo plano
-def process_in_background(df, progress_bar, status_container, status_placeholder):
-    result = process_excel_with_isbns(df, progress_bar, status_container, status_placeholder)
-    st.session_state.result = result
-    st.session_state.processing_complete = True
-
-# Función para cargar el índice de ISBNs
-def load_isbn_index():
-    if os.path.exists(JSON_FILE):
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
-# Función para guardar el índice de ISBNs
-def save_isbn_index(isbn_index):
-    with open(JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(isbn_index, f, indent=2, ensure_ascii=False)
-
-# Función para validar ISBN
-def validate_isbn(isbn):
-    isbn_clean = ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x')
-    return is_isbn10(isbn_clean) or is_isbn13(isbn_clean)
-
-# Inicializar el contador de ISBNs si es necesario
-if st.session_state.isbn_count == 0:
-    isbn_index = load_isbn_index()
-    st.session_state.isbn_count = len(isbn_index)
-
-# Barra lateral con estadísticas y gestión manual de ISBNs
-with st.sidebar:
-    st.header("Estadísticas")
-    
-    # Mostrar contador de ISBNs desde el estado de sesión
-    if st.session_state.isbn_count > 0:
-        st.info(f"Total de ISBNs en la base de datos: {st.session_state.isbn_count}")
-    else:
-        st.info("No hay base de datos de ISBNs creada todavía.")
-    
-    # Opción para descargar o limpiar la base de datos
-    if st.session_state.isbn_count > 0:
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
-            try:
-                isbn_data = f.read()
-                st.download_button(
-                    label="Descargar base de datos de ISBNs",
-                    data=isbn_data,
-                    file_name="isbn_index.json",
-                    mime="application/json",
-                )
-                
-                if st.button("Limpiar base de datos", type="secondary"):
-                    os.remove(JSON_FILE)
-                    st.success("Base de datos limpiada correctamente.")
-                    st.session_state.isbn_count = 0
-                    st.rerun()
-            except:
-                st.warning("Error al acceder a la base de datos.")
-    
-    # Sección para gestión manual de ISBNs
-    st.header("Gestión Manual de ISBNs")
-    
-    # Pestañas para añadir o eliminar ISBNs
-    tab1, tab2 = st.tabs(["Añadir ISBN", "Eliminar ISBN"])
-    
-    with tab1:
-        st.subheader("Añadir ISBN a la base de datos")
-        st.markdown("Puedes añadir varios ISBNs separados por espacios.")
-        isbns_to_add = st.text_area("ISBN(s)", key="add_isbn", placeholder="Introduce uno o varios ISBNs separados por espacios")
-        release_date = st.text_input("Fecha de lanzamiento", key="add_date")
-        
-        if st.button("Añadir a la base de datos", key="btn_add"):
-            if isbns_to_add and release_date:
-                # Cargar índice actual
-                isbn_index = load_isbn_index()
-                
-                # Dividir la entrada en múltiples ISBNs
-                isbn_list = isbns_to_add.strip().split()
-                
-                # Variables para seguimiento del proceso
-                successful_isbns = []
-                invalid_isbns = []
-                
-                # Procesar cada ISBN
-                for isbn in isbn_list:
-                    # Limpiar ISBN de caracteres no numéricos
-                    isbn_clean = ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x')
-                    
-                    # Validar ISBN
-                    if validate_isbn(isbn_clean):
-                        # Convertir ISBN-10 a ISBN-13 para consistencia si es necesario
-                        if is_isbn10(isbn_clean):
-                            isbn_clean = to_isbn13(isbn_clean)
-                        
-                        # Actualizar la base de datos
-                        isbn_index[isbn_clean] = release_date
-                        successful_isbns.append(isbn_clean)
-                    else:
-                        invalid_isbns.append(isbn)
-                
-                # Guardar los cambios en la base de datos
-                if successful_isbns:
-                    save_isbn_index(isbn_index)
-                    st.success(f"Se añadieron {len(successful_isbns)} ISBNs correctamente con fecha {release_date}.")
-                    
-                    # Actualizar el contador en la sesión
-                    st.session_state.isbn_count = len(isbn_index)
-                    
-                    # Mostrar los ISBNs añadidos en una lista expandible
-                    with st.expander("Ver ISBNs añadidos"):
-                        for isbn in successful_isbns:
-                            st.code(f"{isbn}: {release_date}")
-                
-                # Mostrar ISBNs inválidos si hay alguno
-                if invalid_isbns:
-                    st.error(f"No se pudieron añadir {len(invalid_isbns)} ISBNs inválidos: {', '.join(invalid_isbns)}")
-                
-                if successful_isbns:
-                    st.rerun()
-            else:
-                st.warning("Por favor, introduce tanto el ISBN como la fecha de lanzamiento.")
-    
-    with tab2:
-        st.subheader("Eliminar ISBN de la base de datos")
-        isbns_to_remove = st.text_area("ISBN(s) a eliminar", key="remove_isbn", placeholder="Introduce uno o varios ISBNs separados por espacios")
-        
-        # Mostrar opción para buscar en la base de datos
-        if st.checkbox("Buscar en la base de datos", key="search_db"):
-            # Cargar índice actual
-            isbn_index = load_isbn_index()
-            search_term = st.text_input("Término de búsqueda", key="search_term")
-            if search_term:
-                results = {k: v for k, v in isbn_index.items() if search_term in k}
-                if results:
-                    st.write(f"Resultados encontrados ({len(results)}):")
-                    for k, v in results.items():
-                        st.code(f"{k}: {v}")
-                else:
-                    st.info("No se encontraron resultados.")
-        
-        if st.button("Eliminar de la base de datos", key="btn_remove"):
-            if isbns_to_remove:
-                # Cargar índice actual
-                isbn_index = load_isbn_index()
-                
-                # Dividir la entrada en múltiples ISBNs
-                isbn_list = isbns_to_remove.strip().split()
-                
-                # Variables para seguimiento del proceso
-                removed_isbns = []
-                not_found_isbns = []
-                
-                # Procesar cada ISBN
-                for isbn in isbn_list:
-                    # Limpiar ISBN de caracteres no numéricos
-                    isbn_clean = ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x')
-                    
-                    # Verificar si el ISBN existe en la base de datos
-                    if isbn_clean in isbn_index:
-                        # Eliminar el ISBN
-                        del isbn_index[isbn_clean]
-                        removed_isbns.append(isbn_clean)
-                    else:
-                        not_found_isbns.append(isbn_clean)
-                
-                # Guardar los cambios en la base de datos
-                if removed_isbns:
-                    save_isbn_index(isbn_index)
-                    st.success(f"Se eliminaron {len(removed_isbns)} ISBNs correctamente.")
-                    
-                    # Actualizar el contador en la sesión
-                    st.session_state.isbn_count = len(isbn_index)
-                    
-                    # Mostrar los ISBNs eliminados en una lista expandible
-                    with st.expander("Ver ISBNs eliminados"):
-                        for isbn in removed_isbns:
-                            st.code(isbn)
-                
-                # Mostrar ISBNs no encontrados si hay alguno
-                if not_found_isbns:
-                    st.warning(f"{len(not_found_isbns)} ISBNs no encontrados en la base de datos: {', '.join(not_found_isbns)}")
-                
-                if removed_isbns:
-                    st.rerun()
-            else:
-                st.warning("Por favor, introduce el ISBN que deseas eliminar.")
-
-# Verificar si necesitamos actualizar la interfaz debido a nuevos ISBNs
-if st.session_state.needs_update:
-    st.session_state.needs_update = False
-    st.rerun()
-
-# Instrucciones
-with st.expander("📋 Instrucciones de uso", expanded=True):
-    st.markdown("""
-    1. Sube un archivo Excel (.xls o .xlsx) que contenga ISBNs en la primera columna.
-    2. El sistema añadirá una nueva columna con las fechas de lanzamiento de cada ISBN.
-    3. El sistema primero comprobará si el ISBN existe en la base de datos local, y si no, buscará la información a través de APIs externas.
-    4. Cuando termine el proceso, podrás descargar el archivo Excel procesado.
-    5. Puedes añadir o eliminar ISBNs manualmente usando las opciones en la barra lateral:
-       - Para añadir: Introduce uno o varios ISBNs separados por espacios y la fecha de lanzamiento
-       - Para eliminar: Introduce uno o varios ISBNs separados por espacios
-    """)
-
-# Carga de archivo
-uploaded_file = st.file_uploader("Selecciona el archivo Excel con ISBNs", type=["xls", "xlsx"])
-
-if uploaded_file is not None:
-    try:
-        # Cargar archivo
-        df = pd.read_excel(uploaded_file)
-        
-        # Mostrar vista previa
-        st.subheader("Vista previa del archivo")
-        st.dataframe(df.head(5))
-        
-        # Obtener resumen preliminar
-        if os.path.exists(JSON_FILE):
-            with open(JSON_FILE, 'r', encoding='utf-8') as f:
-                try:
-                    isbn_index = json.load(f)
-                    total_isbns = len(df)
-                    isbns_in_db = sum(1 for isbn in df.iloc[:, 0].astype(str).str.strip() if ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x') in isbn_index)
-                    
-                    st.info(f"De los {total_isbns} ISBNs en tu archivo, {isbns_in_db} ya están en la base de datos y {total_isbns - isbns_in_db} deberán buscarse en APIs.")
-                except:
-                    pass
-        
-        # Verificar que hay datos en la primera columna
-        if df.shape[0] == 0:
-            st.error("El archivo no contiene datos")
-        else:
-            # Procesar archivo cuando el usuario haga clic en el botón
-            if st.button("Procesar ISBNs", type="primary"):
-                st.subheader("Procesando archivo...")
-                
-                # Crear barra de progreso
-                progress_bar = st.progress(0)
-                
-                # Crear contenedor para mensajes de estado
-                status_container = st.container()
-                status_placeholder = st.empty()
-                
-                # Ejecutar una primera actualización cada segundo para mantener las estadísticas actualizadas
-                update_placeholder = st.empty()
-                
-                # Configurar el contador de actualizaciones para la sesión
-                if 'update_counter' not in st.session_state:
-                    st.session_state.update_counter = 0
-                
-                # Procesar el archivo
-                result_df, stats, messages = process_excel_with_isbns(df, progress_bar, status_container, status_placeholder)
-                
-                if result_df is not None:
-                    # Mostrar estadísticas finales
-                    st.success(f"Proceso completado. Se procesaron {stats['total']} ISBNs")
-                    
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("ISBNs del caché", stats["from_cache"])
-                    with col2:
-                        st.metric("ISBNs de la API", stats["from_api"])
-                    with col3:
-                        st.metric("ISBNs no encontrados", stats["not_found"])
-                    
-                    # Mostrar resultado
-                    st.subheader("Resultado")
-                    st.dataframe(result_df)
-                    
-                    # Guardar el DataFrame en un archivo Excel en memoria
-                    buffer = io.BytesIO()
-                    
-                    # Asegurarnos de que los ISBNs se formateen como texto en Excel
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                        # Crear una copia del DataFrame
-                        export_df = result_df.copy()
-                        
-                        # Definir formatos personalizados para columnas específicas
-                        formats = {
-                            export_df.columns[0]: {'format': '@'}  # Formato de texto para la columna ISBN
-                        }
-                        
-                        # Exportar a Excel
-                        export_df.to_excel(writer, index=False, sheet_name='ISBNs')
-                        
-                        # Acceder a la hoja de trabajo
-                        workbook = writer.book
-                        worksheet = writer.sheets['ISBNs']
-                        
-                        # Aplicar formato de texto a la columna de ISBNs
-                        for col_idx, col_name in enumerate(export_df.columns):
-                            col_letter = chr(65 + col_idx)  # A, B, C, etc.
-                            for row_idx in range(2, len(export_df) + 2):  # Excel es 1-indexed y tenemos header
-                                cell = f"{col_letter}{row_idx}"
-                                if col_name == export_df.columns[0]:  # Si es la columna de ISBNs
-                                    # Aplicar formato de texto
-                                    worksheet[cell].number_format = '@'
-                    
-                    # Obtener los datos del buffer
-                    buffer.seek(0)
-                    
-                    # Botón de descarga
-                    st.download_button(
-                        label="Descargar archivo procesado",
-                        data=buffer,
-                        file_name="ISBNs_procesados.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    )
-                    
-                    # Mostrar el log completo de procesamiento
-                    with st.expander("Ver log completo de procesamiento"):
-                        for msg in messages:
-                            st.text(msg)
-    except Exception as e:
-        st.error(f"Error al procesar el archivo: {e}")
-
-# Mostrar información adicional al final
-st.markdown("---")
-st.markdown("### Acerca de")
-st.markdown("""
-Esta aplicación busca fechas de lanzamiento para ISBNs utilizando varias APIs (Google Books y Open Library).
-Los ISBNs encontrados se almacenan en una base de datos local para acelerar futuras búsquedas.
-La aplicación también permite gestionar manualmente los ISBNs en la base de datos, pudiendo añadir o eliminar varios ISBNs a la vez.
-""")
+import streamlit as st
+import pandas as pd
+import os
+import time
+import uuid
+from isbnlib import is_isbn10, is_isbn13, to_isbn13
+from lookup_engine import MAX_IN_FLIGHT
+from isbn_store import ISBNStore, DB_FILE, JSON_FILE, ORIGIN_MANUAL
+from compact_index import COMPACT_FILE
+from normalization import normalize_isbns
+from processor import empty_stats, format_status, summarize_file
+from refresh_scheduler import RefreshScheduler
+from jobs import DOWNLOADS_DIR, FAILED, FINISHED, JOBS_DB, QUEUED, UPLOADS_DIR, JobRunner, JobStore, log_path, tail_lines
+from table_io import CSV, EXCEL, MIME_TYPES, PARQUET, detect_format, read_head, sheet_names
+from provider_stats import PROVIDER_STATS
+from metrics import METRICS, snapshot_from_json, summarize
+from bulk_import import FEED_FORMATS, POLICIES, POLICY_LABELS, PRECISE, detect_feed_format, import_feed, read_feed
+
+# Configurar título y descripción de la página
+st.set_page_config(page_title="Procesador de ISBNs", page_icon="📚", layout="wide")
+st.title("Procesador de ISBNs")
+
+# Crear directorios si no existen
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+
+# Filas del resultado que se muestran en la página (el archivo completo se descarga)
+RESULT_PREVIEW_ROWS = 1000
+
+# Resultados por página en la búsqueda de la barra lateral
+SEARCH_PAGE_SIZE = 50
+
+# Segundos entre actualizaciones de la vista de un trabajo en curso
+JOB_POLL_INTERVAL = 2
+
+# Líneas del log que se muestran en la página (el log completo se descarga)
+LOG_PREVIEW_LINES = 1000
+
+# Resúmenes de archivos subidos que se guardan a la vez
+UPLOAD_SUMMARY_CACHE_SIZE = 8
+
+JOB_STATUS_LABELS = {
+    "queued": "En cola",
+    "running": "En curso",
+    "done": "Completado",
+    "failed": "Fallido",
+}
+
+# Base de datos de ISBNs (se migra automáticamente desde isbn_index.json la primera vez).
+# Se crea una sola vez por proceso y la comparten todas las sesiones y recargas.
+# Si existe el índice compacto (creado con `cli.py --compact-index`) se usa en
+# lugar de cargar todo el índice en memoria
+@st.cache_resource
+def get_isbn_store():
+    compact_file = COMPACT_FILE if os.path.exists(COMPACT_FILE) else None
+    return ISBNStore(DB_FILE, JSON_FILE, compact_file=compact_file)
+
+# Trabajadores que procesan los archivos en segundo plano. Viven mientras viva
+# el servidor, así que recargar o cerrar la página no interrumpe el proceso, y
+# al arrancar retoman los trabajos que quedaron a medias
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(get_isbn_store(), JobStore(JOBS_DB)).start()
+
+# Refresco en segundo plano de las fechas antiguas, incompletas o no encontradas.
+# Solo trabaja mientras no hay ningún archivo en proceso
+@st.cache_resource
+def get_refresh_scheduler():
+    return RefreshScheduler(get_isbn_store(), is_idle=get_job_runner().idle).start()
+
+# Resumen de un archivo subido (ISBNs distintos y columnas de cada hoja). Leer el
+# archivo entero tarda varios segundos, así que se guarda por archivo subido y
+# hojas elegidas en lugar de repetirse en cada recarga de la página
+@st.cache_data(max_entries=UPLOAD_SUMMARY_CACHE_SIZE, show_spinner="Leyendo el archivo...")
+def summarize_upload(file_id, input_format, sheets, _uploaded_file):
+    return summarize_file(_uploaded_file, input_format, sheets=list(sheets) if sheets else None)
+
+# Comprobar una vez por recarga si otro proceso ha modificado la base de datos
+store = get_isbn_store().refresh()
+job_runner = get_job_runner()
+get_refresh_scheduler()
+
+# Creación de un estado compartido para seguimiento
+if 'processing_complete' not in st.session_state:
+    st.session_state.processing_complete = False
+if 'current_stats' not in st.session_state:
+    st.session_state.current_stats = empty_stats()
+if 'isbn_count' not in st.session_state:
+    st.session_state.isbn_count = 0
+if 'needs_update' not in st.session_state:
+    st.session_state.needs_update = False
+
+# Guardar el archivo subido en disco y ponerlo en la cola de trabajos.
+# Devuelve el identificador del trabajo
+def submit_job(uploaded_file, input_format, output_format, max_in_flight=MAX_IN_FLIGHT, sheets=None):
+    job_id = uuid.uuid4().hex
+    input_path = os.path.join(UPLOADS_DIR, f"{job_id}.{input_format}")
+    with open(input_path, 'wb') as f:
+        f.write(uploaded_file.getbuffer())
+    output_path = os.path.join(DOWNLOADS_DIR, f"{job_id}.{output_format}")
+    return job_runner.submit(
+        uploaded_file.name, input_path, input_format, output_path, output_format, max_in_flight, job_id=job_id,
+        sheets=sheets,
+    )
+
+# Mostrar las estadísticas finales de un trabajo
+def show_job_stats(stats):
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("ISBNs del caché", stats["from_cache"])
+    with col2:
+        st.metric("ISBNs de la API", stats["from_api"])
+    with col3:
+        st.metric("ISBNs no encontrados", stats["not_found"])
+    with col4:
+        st.metric("Conocidos sin fecha", stats["known_missing"])
+    with col5:
+        st.metric("ISBNs no válidos", stats["invalid"])
+    
+    # Mostrar aciertos y latencia observados de cada proveedor
+    provider_summary = PROVIDER_STATS.summary()
+    if provider_summary:
+        with st.expander("Rendimiento de los proveedores"):
+            st.dataframe(pd.DataFrame([
+                {
+                    "Proveedor": provider,
+                    "Búsquedas": data["lookups"],
+                    "Aciertos": data["hits"],
+                    "Latencia media por ISBN (s)": round(data["latency"], 4),
+                }
+                for provider, data in provider_summary.items()
+            ]))
+
+# Mostrar el resultado de un trabajo terminado
+def show_job_result(job):
+    if job["status"] == FAILED:
+        st.error(f"Error al procesar el archivo {job['name']}: {job['error']}")
+        return
+    
+    stats = job["stats"]
+    st.success(f"Proceso completado. Se procesaron {stats['total']} ISBNs")
+    show_job_stats(stats)
+    
+    # Tiempo de cada etapa del trabajo y contadores de peticiones y bytes
+    if job.get("metrics"):
+        stage_rows, counters = summarize(snapshot_from_json(job["metrics"]))
+        with st.expander("Tiempos por etapa"):
+            st.dataframe(pd.DataFrame([
+                {
+                    "Medida": row["metric"],
+                    "Etiquetas": row["labels"],
+                    "Veces": row["count"],
+                    "Tiempo total (s)": round(row["total_seconds"], 3),
+                    "Tiempo medio (ms)": round(row["mean_seconds"] * 1000, 1),
+                }
+                for row in stage_rows
+            ]), hide_index=True)
+            if counters:
+                st.dataframe(
+                    pd.DataFrame({"Contador": list(counters), "Valor": list(counters.values())}), hide_index=True,
+                )
+    
+    # Mostrar resultado (primeras filas)
+    st.subheader("Resultado")
+    result_preview = read_head(job["output_path"], job["output_format"], rows=RESULT_PREVIEW_ROWS)
+    if stats["total"] > len(result_preview):
+        st.caption(f"Se muestran las primeras {len(result_preview)} filas; descarga el archivo para verlas todas.")
+    st.dataframe(result_preview)
+    
+    # Botón de descarga
+    with open(job["output_path"], 'rb') as f:
+        st.download_button(
+            label="Descargar archivo procesado",
+            data=f.read(),
+            file_name=f"{os.path.splitext(job['name'])[0]}_procesado.{job['output_format']}",
+            mime=MIME_TYPES[job["output_format"]],
+        )
+    
+    # Log de procesamiento: las últimas líneas en una tabla (una sola pieza de la
+    # página, con desplazamiento) y el log completo como archivo descargable
+    if os.path.exists(log_path(job)):
+        with st.expander("Ver log completo de procesamiento"):
+            log_lines = tail_lines(log_path(job), LOG_PREVIEW_LINES)
+            st.dataframe(pd.DataFrame({"Mensaje": log_lines}), hide_index=True)
+            with open(log_path(job), 'rb') as f:
+                st.download_button(
+                    label="Descargar log completo",
+                    data=f.read(),
+                    file_name=f"{os.path.splitext(job['name'])[0]}_log.txt",
+                    mime="text/plain",
+                )
+
+# Vista de un trabajo en curso. Solo se vuelve a ejecutar este fragmento cada
+# JOB_POLL_INTERVAL segundos, no la página entera; al terminar el trabajo se
+# recarga la página para mostrar el resultado
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_job_progress(job_id):
+    job = job_runner.jobs.get(job_id)
+    if job is None or job["status"] in FINISHED:
+        st.session_state.isbn_count = len(get_isbn_store().refresh())
+        st.rerun()
+    
+    st.subheader(f"Procesando archivo {job['name']}...")
+    if job["status"] == QUEUED:
+        st.info("El archivo está en cola y se procesará en cuanto termine el trabajo anterior.")
+        return
+    
+    stats = job["stats"]
+    st.progress(job["processed"] / stats["total"] if stats["total"] else 0.0)
+    if job["searched"]:
+        st.caption(f"Búsquedas en API completadas: {job['completed']} de {job['searched']} ISBNs distintos")
+    st.text(format_status(stats, tail_lines(log_path(job))))
+    st.caption("Puedes cerrar o recargar la página: el proceso continúa en segundo plano.")
+
+# Función para cargar el índice de ISBNs. Devuelve el índice compartido en
+# memoria, que admite las mismas consultas que un diccionario
+def load_isbn_index():
+    return get_isbn_store()
+
+# Función para validar ISBN
+def validate_isbn(isbn):
+    isbn_clean = ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x')
+    return is_isbn10(isbn_clean) or is_isbn13(isbn_clean)
+
+# Inicializar el contador de ISBNs si es necesario
+if st.session_state.isbn_count == 0:
+    st.session_state.isbn_count = len(store)
+
+# Barra lateral con estadísticas y gestión manual de ISBNs
+with st.sidebar:
+    st.header("Estadísticas")
+    
+    # Mostrar contador de ISBNs desde el estado de sesión
+    if st.session_state.isbn_count > 0:
+        st.info(f"Total de ISBNs en la base de datos: {st.session_state.isbn_count}")
+    else:
+        st.info("No hay base de datos de ISBNs creada todavía.")
+    
+    # Opción para descargar o limpiar la base de datos. El JSON se genera solo
+    # al pulsar el botón de descarga, no en cada recarga de la página
+    if st.session_state.isbn_count > 0:
+        st.download_button(
+            label="Descargar base de datos de ISBNs",
+            data=store.export_json,
+            file_name="isbn_index.json",
+            mime="application/json",
+        )
+        
+        if st.button("Limpiar base de datos", type="secondary"):
+            store.clear()
+            st.success("Base de datos limpiada correctamente.")
+            st.session_state.isbn_count = 0
+            st.rerun()
+    
+    # Métricas acumuladas del proceso desde que arrancó
+    st.header("Métricas")
+    col_json, col_prom = st.columns(2)
+    with col_json:
+        st.download_button(
+            label="JSON", data=METRICS.to_json(), file_name="isbn_metrics.json", mime="application/json",
+        )
+    with col_prom:
+        st.download_button(
+            label="Prometheus", data=METRICS.to_prometheus(), file_name="isbn_metrics.prom", mime="text/plain",
+        )
+    
+    # Sección para gestión manual de ISBNs
+    st.header("Gestión Manual de ISBNs")
+    
+    # Pestañas para añadir o eliminar ISBNs
+    tab1, tab2, tab3 = st.tabs(["Añadir ISBN", "Eliminar ISBN", "Importar listado"])
+    
+    with tab1:
+        st.subheader("Añadir ISBN a la base de datos")
+        st.markdown("Puedes añadir varios ISBNs separados por espacios.")
+        isbns_to_add = st.text_area("ISBN(s)", key="add_isbn", placeholder="Introduce uno o varios ISBNs separados por espacios")
+        release_date = st.text_input("Fecha de lanzamiento", key="add_date")
+        
+        if st.button("Añadir a la base de datos", key="btn_add"):
+            if isbns_to_add and release_date:
+                # Dividir la entrada en múltiples ISBNs
+                isbn_list = isbns_to_add.strip().split()
+                
+                # Variables para seguimiento del proceso
+                successful_isbns = []
+                invalid_isbns = []
+                
+                # Procesar cada ISBN
+                for isbn in isbn_list:
+                    # Limpiar ISBN de caracteres no numéricos
+                    isbn_clean = ''.join(c for c in isbn if c.isdigit() or c == 'X' or c == 'x')
+                    
+                    # Validar ISBN
+                    if validate_isbn(isbn_clean):
+                        # Convertir ISBN-10 a ISBN-13 para consistencia si es necesario
+                        if is_isbn10(isbn_clean):
+                            isbn_clean = to_isbn13(isbn_clean)
+                        
+                        successful_isbns.append(isbn_clean)
+                    else:
+                        invalid_isbns.append(isbn)
+                
+                # Guardar los cambios en la base de datos
+                if successful_isbns:
+                    store.put_many({isbn: release_date for isbn in successful_isbns}, ORIGIN_MANUAL)
+                    st.success(f"Se añadieron {len(successful_isbns)} ISBNs correctamente con fecha {release_date}.")
+                    
+                    # Actualizar el contador en la sesión
+                    st.session_state.isbn_count = len(store)
+                    
+                    # Mostrar los ISBNs añadidos en una lista expandible
+                    with st.expander("Ver ISBNs añadidos"):
+                        for isbn in successful_isbns:
+                            st.code(f"{isbn}: {release_date}")
+                
+                # Mostrar ISBNs inválidos si hay alguno
+                if invalid_isbns:
+                    st.error(f"No se pudieron añadir {len(invalid_isbns)} ISBNs inválidos: {', '.join(invalid_isbns)}")
+                
+                if successful_isbns:
+                    st.rerun()
+            else:
+                st.warning("Por favor, introduce tanto el ISBN como la fecha de lanzamiento.")
+    
+    with tab2:
+        st.subheader("Eliminar ISBN de la base de datos")
+        isbns_to_remove = st.text_area("ISBN(s) a eliminar", key="remove_isbn", placeholder="Introduce uno o varios ISBNs separados por espacios")
+        
+        # Mostrar opción para buscar en la base de datos
+        if st.checkbox("Buscar en la base de datos", key="search_db"):
+            search_field = st.radio("Buscar por", ["ISBN (prefijo)", "Fecha"], key="search_field", horizontal=True)
+            search_term = st.text_input("Término de búsqueda", key="search_term")
+            if search_term:
+                # Índice de búsqueda en memoria (solo se reconstruye si la base de datos cambia)
+                search_index = store.search_index()
+                search = search_index.search_date if search_field == "Fecha" else search_index.search_prefix
+                page = st.session_state.get("search_page", 1)
+                total, results = search(search_term, (page - 1) * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE)
+                
+                # Si el término ha cambiado y hay menos páginas, volver a la primera
+                pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+                if total and page > pages:
+                    page = 1
+                    st.session_state.search_page = 1
+                    total, results = search(search_term, 0, SEARCH_PAGE_SIZE)
+                
+                if total:
+                    st.write(f"Resultados encontrados ({total}):")
+                    st.dataframe(pd.DataFrame(results, columns=["ISBN", "Fecha"]), hide_index=True)
+                    if pages > 1:
+                        st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, key="search_page")
+                else:
+                    st.info("No se encontraron resultados.")
+        
+        if st.button("Eliminar de la base de datos", key="btn_remove"):
+            if isbns_to_remove:
+                # Dividir la entrada en múltiples ISBNs
+                isbn_list = isbns_to_remove.strip().split()
+                
+                # Limpiar ISBNs y convertirlos a ISBN-13 como en el resto de la aplicación
+                normalized = normalize_isbns(pd.Series(isbn_list))
+                cleaned_isbns = normalized['clean'].tolist()
+                
+                # Eliminar en una sola transacción los ISBNs que existan en la base de datos,
+                # tanto en su forma ISBN-13 como tal y como se introdujeron
+                removed_isbns = store.delete_many(list(dict.fromkeys(normalized['canonical'].tolist() + cleaned_isbns)))
+                not_found_isbns = [
+                    isbn_clean for isbn_clean, key in zip(cleaned_isbns, normalized['canonical'])
+                    if isbn_clean not in removed_isbns and key not in removed_isbns
+                ]
+                
+                if removed_isbns:
+                    st.success(f"Se eliminaron {len(removed_isbns)} ISBNs correctamente.")
+                    
+                    # Actualizar el contador en la sesión
+                    st.session_state.isbn_count = len(store)
+                    
+                    # Mostrar los ISBNs eliminados en una lista expandible
+                    with st.expander("Ver ISBNs eliminados"):
+                        for isbn in removed_isbns:
+                            st.code(isbn)
+                
+                # Mostrar ISBNs no encontrados si hay alguno
+                if not_found_isbns:
+                    st.warning(f"{len(not_found_isbns)} ISBNs no encontrados en la base de datos: {', '.join(not_found_isbns)}")
+                
+                if removed_isbns:
+                    st.rerun()
+            else:
+                st.warning("Por favor, introduce el ISBN que deseas eliminar.")
+    
+    with tab3:
+        st.subheader("Importar un listado de fechas")
+        st.markdown("Archivo con una columna de ISBNs y otra de fechas, o un JSON como el de la base de datos.")
+        feed_file = st.file_uploader("Listado", type=list(FEED_FORMATS), key="import_file")
+        policy = st.radio(
+            "Si el ISBN ya tiene fecha", POLICIES, index=POLICIES.index(PRECISE),
+            format_func=POLICY_LABELS.get, key="import_policy",
+        )
+        
+        if st.button("Importar", key="btn_import"):
+            if feed_file is not None:
+                try:
+                    report = import_feed(store, read_feed(feed_file, detect_feed_format(feed_file.name)), policy)
+                except (OSError, ValueError) as e:
+                    st.error(f"Error al importar el listado: {e}")
+                else:
+                    st.success(
+                        f"Se importaron {report['added'] + report['updated']} ISBNs "
+                        f"({report['added']} nuevos, {report['updated']} actualizados) de {report['rows']} filas."
+                    )
+                    if report['kept'] or report['unchanged']:
+                        st.info(f"{report['kept']} ISBNs conservan su fecha y {report['unchanged']} ya tenían la misma.")
+                    if report['invalid'] or report['empty_date'] or report['duplicates']:
+                        st.warning(
+                            f"Se ignoraron {report['invalid']} ISBNs no válidos, {report['empty_date']} filas sin fecha "
+                            f"y {report['duplicates']} ISBNs repetidos."
+                        )
+                    st.session_state.isbn_count = len(store)
+            else:
+                st.warning("Por favor, selecciona el archivo a importar.")
+
+# Verificar si necesitamos actualizar la interfaz debido a nuevos ISBNs
+if st.session_state.needs_update:
+    st.session_state.needs_update = False
+    st.rerun()
+
+# Instrucciones
+with st.expander("📋 Instrucciones de uso", expanded=True):
+    st.markdown("""
+    1. Sube un archivo Excel (.xls o .xlsx), CSV o Parquet con ISBNs. Las columnas de ISBNs se detectan solas en cada hoja; si no se detecta ninguna, se usa la primera columna.
+    2. El sistema añadirá una columna con las fechas de lanzamiento por cada columna de ISBNs, en todas las hojas elegidas.
+    3. El sistema primero comprobará si el ISBN existe en la base de datos local, y si no, buscará la información a través de APIs externas.
+    4. Cuando termine el proceso, podrás descargar el archivo Excel procesado. El proceso continúa en segundo plano aunque cierres o recargues la página, y puedes volver a él desde "Trabajos recientes".
+    5. Puedes añadir o eliminar ISBNs manualmente usando las opciones en la barra lateral:
+       - Para añadir: Introduce uno o varios ISBNs separados por espacios y la fecha de lanzamiento
+       - Para eliminar: Introduce uno o varios ISBNs separados por espacios
+       - Para importar: Sube un listado con una columna de ISBNs y otra de fechas (Excel, CSV, Parquet o JSON)
+    """)
+
+# Carga de archivo
+uploaded_file = st.file_uploader("Selecciona el archivo Excel con ISBNs", type=["xls", "xlsx", "csv", "parquet"])
+
+if uploaded_file is not None:
+    try:
+        input_format = detect_format(uploaded_file.name)
+        
+        # Hojas a procesar (por defecto, todas)
+        all_sheets = sheet_names(uploaded_file, input_format)
+        sheets = None
+        if len(all_sheets) > 1:
+            sheets = st.multiselect("Hojas a procesar", all_sheets, default=all_sheets) or all_sheets
+        
+        # Mostrar vista previa (solo se leen las primeras filas)
+        st.subheader("Vista previa del archivo")
+        st.dataframe(read_head(uploaded_file, input_format, sheet=sheets[0] if sheets else None))
+        
+        # Obtener resumen preliminar leyendo las columnas de ISBNs de cada hoja
+        summary, plan = summarize_upload(uploaded_file.file_id, input_format, tuple(sheets or ()), uploaded_file)
+        st.caption("Columnas de ISBNs: " + "; ".join(
+            (f"{sheet}: " if sheet is not None else "") + (", ".join(map(str, columns)) or "ninguna")
+            for sheet, columns in plan.items()
+        ))
+        if len(store) > 0:
+            isbn_index = load_isbn_index()
+            total_isbns = int(summary['rows'].sum())
+            in_db = summary.index.map(lambda key: key in isbn_index).to_numpy(dtype=bool)
+            known_missing = summary.index.map(lambda key: isbn_index.get_miss(key) is not None).to_numpy(dtype=bool) & ~in_db
+            isbns_in_db = int(summary['rows'][in_db].sum())
+            isbns_known_missing = int(summary['rows'][known_missing].sum())
+            
+            st.info(
+                f"De los {total_isbns} ISBNs en tu archivo, {isbns_in_db} ya están en la base de datos, "
+                f"{isbns_known_missing} son conocidos sin fecha y "
+                f"{total_isbns - isbns_in_db - isbns_known_missing} deberán buscarse en APIs."
+            )
+        
+        # Número de búsquedas simultáneas en las APIs
+        max_in_flight = st.number_input("Búsquedas simultáneas en API", min_value=1, max_value=32, value=MAX_IN_FLIGHT)
+        
+        # Formato del archivo procesado (varias hojas solo caben en un Excel)
+        output_format = st.selectbox("Formato del archivo procesado", [EXCEL] if len(plan) > 1 else [EXCEL, CSV, PARQUET])
+        
+        # Poner el archivo en la cola de trabajos cuando el usuario haga clic en el botón.
+        # El identificador del trabajo se guarda en la URL para poder volver a él
+        if st.button("Procesar ISBNs", type="primary"):
+            st.query_params["job"] = submit_job(uploaded_file, input_format, output_format, max_in_flight, sheets)
+    except Exception as e:
+        st.error(f"Error al procesar el archivo: {e}")
+
+# Trabajos recientes, para volver a uno después de cerrar la página
+recent_jobs = job_runner.jobs.recent()
+if recent_jobs:
+    with st.expander("Trabajos recientes"):
+        job_labels = {
+            job["id"]: (
+                f"{job['name']} · {JOB_STATUS_LABELS[job['status']]} · "
+                f"{time.strftime('%d/%m/%Y %H:%M', time.localtime(job['created_at']))}"
+            )
+            for job in recent_jobs
+        }
+        selected_job = st.selectbox(
+            "Trabajo", list(job_labels), format_func=job_labels.get, index=None,
+            placeholder="Elige un trabajo para ver su estado",
+        )
+        if selected_job:
+            st.query_params["job"] = selected_job
+
+# Estado o resultado del trabajo seleccionado
+job_id = st.query_params.get("job")
+if job_id:
+    job = job_runner.jobs.get(job_id)
+    if job is None:
+        st.warning("El trabajo no existe.")
+    elif job["status"] in FINISHED:
+        show_job_result(job)
+    else:
+        show_job_progress(job_id)
+
+# Mostrar información adicional al final
+st.markdown("---")
+st.markdown("### Acerca de")
+st.markdown("""
+Esta aplicación busca fechas de lanzamiento para ISBNs utilizando varias APIs (Google Books y Open Library).
+Los ISBNs encontrados se almacenan en una base de datos local para acelerar futuras búsquedas.
+La aplicación también permite gestionar manualmente los ISBNs en la base de datos, pudiendo añadir o eliminar varios ISBNs a la vez.
+""")
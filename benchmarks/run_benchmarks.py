@@ -0,0 +1,297 @@
+# Banco de pruebas de rendimiento contra proveedores simulados en local (no hace
+# peticiones reales). Desde la raíz del proyecto:
+#   python -m benchmarks.run_benchmarks --sizes 1000 10000 --json resultados.json
+#   python -m benchmarks.run_benchmarks --compare resultados.json
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import lookup_engine
+import providers
+from benchmarks.stub_providers import GOOGLE_BOOKS, OPEN_LIBRARY, ProviderStub, synthetic_date
+from isbn_store import ISBNStore
+from normalization import ISBN13_WEIGHTS
+from processor import apply_dates, resolve_isbns, summarize_isbns
+from table_io import EXCEL, ExcelChunkWriter, iter_chunks
+
+# Tamaños de los libros sintéticos (filas) y proporciones de ISBNs ya en caché
+SIZES = (1000, 10000, 100000)
+CACHE_RATIOS = (0.0, 0.5, 0.9)
+
+# Búsquedas individuales (fetch_isbn_date_from_api) que se miden en cada caso
+SINGLE_LOOKUPS = 50
+
+STAGES = ("load", "normalize", "lookup", "merge", "export")
+
+# Generar `rows` ISBN-13 válidos, con una parte repetida y una parte no válida,
+# algunos con guiones como en los archivos reales
+def synthetic_isbns(rows, duplicate_ratio=0.2, invalid_ratio=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    distinct = max(1, int(rows * (1 - duplicate_ratio)))
+    body = rng.choice(10 ** 9, size=distinct, replace=False)
+    digits = np.zeros((distinct, 12), dtype=np.int64)
+    digits[:, :3] = (9, 7, 8)
+    for position in range(11, 2, -1):
+        digits[:, position] = body % 10
+        body //= 10
+    check = (10 - (digits @ ISBN13_WEIGHTS[:12]) % 10) % 10
+    isbns = [''.join(map(str, row)) + str(c) for row, c in zip(digits.tolist(), check.tolist())]
+
+    column = [isbns[i] for i in rng.integers(0, distinct, size=rows - distinct)] + isbns
+    rng.shuffle(column)
+    for i in rng.choice(rows, size=int(rows * invalid_ratio), replace=False):
+        column[i] = column[i][:-1] + str((int(column[i][-1]) + 1) % 10)
+    for i in range(0, rows, 7):
+        value = column[i]
+        column[i] = f"{value[:3]}-{value[3:5]}-{value[5:9]}-{value[9:12]}-{value[12]}"
+    return column, isbns
+
+def write_workbook(path, column):
+    writer = ExcelChunkWriter(path)
+    writer.write(pd.DataFrame({"ISBN": column, "Título": [f"Libro {i}" for i in range(len(column))]}))
+    writer.close()
+
+# Guardar en la base de datos la proporción `cache_ratio` de los ISBNs distintos
+def seed_store(store, isbns, cache_ratio):
+    cached = isbns[:int(len(isbns) * cache_ratio)]
+    store.put_many({isbn: "{:04d}-{:02d}-{:02d}".format(*synthetic_date(isbn)) for isbn in cached})
+    return set(cached)
+
+# Medir una etapa: tiempo, filas por segundo y pico de memoria (con tracemalloc)
+def measure(results, name, rows, trace_memory, function):
+    if trace_memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    value = function()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    results[name] = {
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed > 0 else float("inf"),
+        "peak_mb": peak / 2 ** 20 if peak is not None else None,
+    }
+    return value
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+# Envolver los buscadores de proveedores para medir la latencia de cada petición
+def instrument_fetchers(latencies):
+    def timed(fetch, provider):
+        def wrapper(*args):
+            started = time.perf_counter()
+            try:
+                return fetch(*args)
+            finally:
+                latencies.setdefault(provider, []).append(time.perf_counter() - started)
+        return wrapper
+
+    originals = (dict(providers.BATCH_FETCHERS), dict(providers.FETCHERS))
+    for fetchers in (providers.BATCH_FETCHERS, providers.FETCHERS):
+        for provider, fetch in list(fetchers.items()):
+            fetchers[provider] = timed(fetch, provider)
+    return originals
+
+def restore_fetchers(originals):
+    providers.BATCH_FETCHERS.update(originals[0])
+    providers.FETCHERS.update(originals[1])
+
+def latency_summary(latencies):
+    samples = [value for values in latencies.values() for value in values]
+    return {
+        "requests": len(samples),
+        "p50_ms": percentile(samples, 0.5) * 1000 if samples else None,
+        "p99_ms": percentile(samples, 0.99) * 1000 if samples else None,
+    }
+
+# Ejecutar un caso: libro de `rows` filas con `cache_ratio` de ISBNs en caché
+def run_case(rows, cache_ratio, workdir, args):
+    case_dir = tempfile.mkdtemp(dir=workdir)
+    column, isbns = synthetic_isbns(rows, seed=args.seed)
+    input_path = os.path.join(case_dir, "input.xlsx")
+    write_workbook(input_path, column)
+    store = ISBNStore(os.path.join(case_dir, "index.db"), None)
+    cached = seed_store(store, isbns, cache_ratio)
+
+    stages = {}
+    latencies = {}
+    originals = instrument_fetchers(latencies)
+    try:
+        chunks = measure(stages, "load", rows, args.trace_memory, lambda: list(iter_chunks(input_path, EXCEL)))
+        summary = measure(
+            stages, "normalize", rows, args.trace_memory,
+            lambda: summarize_isbns(pd.concat(chunk.iloc[:, 0] for chunk in chunks)),
+        )
+        dates_by_key, stats, _ = measure(
+            stages, "lookup", rows, args.trace_memory,
+            lambda: resolve_isbns(summary, store, max_in_flight=args.max_in_flight),
+        )
+        lookup_latency = latency_summary(latencies)
+        measure(
+            stages, "merge", rows, args.trace_memory,
+            lambda: [apply_dates(chunk, dates_by_key) for chunk in chunks],
+        )
+
+        def export():
+            writer = ExcelChunkWriter(os.path.join(case_dir, "output.xlsx"))
+            for chunk in chunks:
+                writer.write(chunk)
+            writer.close()
+        measure(stages, "export", rows, args.trace_memory, export)
+
+        # Búsquedas individuales de ISBNs que no están en caché
+        latencies.clear()
+        singles = [isbn for isbn in isbns if isbn not in cached][-args.single_lookups:]
+        for isbn in singles:
+            providers.fetch_isbn_date_from_api(isbn)
+        single_latency = latency_summary(latencies)
+    finally:
+        restore_fetchers(originals)
+        store.close()
+        shutil.rmtree(case_dir, ignore_errors=True)
+
+    total = sum(stage["seconds"] for stage in stages.values())
+    return {
+        "rows": rows,
+        "cache_ratio": cache_ratio,
+        "stages": stages,
+        "total_seconds": total,
+        "rows_per_sec": rows / total if total > 0 else float("inf"),
+        "lookup_latency": lookup_latency,
+        "single_lookup_latency": single_latency,
+        "stats": stats,
+    }
+
+def _format(value, pattern):
+    return "-" if value is None else pattern.format(value)
+
+def print_report(cases, stubs):
+    header = f"{'filas':>7} {'caché':>6} {'etapa':<10} {'seg':>8} {'filas/s':>11} {'pico MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for case in cases:
+        for name in STAGES:
+            stage = case["stages"][name]
+            print(
+                f"{case['rows']:>7} {case['cache_ratio']:>6.0%} {name:<10} {stage['seconds']:>8.2f} "
+                f"{stage['rows_per_sec']:>11.0f} {_format(stage['peak_mb'], '{:.1f}'):>8}"
+            )
+        lookup, single = case["lookup_latency"], case["single_lookup_latency"]
+        print(
+            f"{case['rows']:>7} {case['cache_ratio']:>6.0%} {'total':<10} {case['total_seconds']:>8.2f} "
+            f"{case['rows_per_sec']:>11.0f}   lotes: {lookup['requests']} peticiones, "
+            f"p50 {_format(lookup['p50_ms'], '{:.0f}')} ms, p99 {_format(lookup['p99_ms'], '{:.0f}')} ms; "
+            f"individuales: p50 {_format(single['p50_ms'], '{:.0f}')} ms, p99 {_format(single['p99_ms'], '{:.0f}')} ms"
+        )
+        print()
+    for stub in stubs:
+        print(f"{stub.provider}: {stub.requests} peticiones, {stub.throttled} con 429, {stub.errors} con 503")
+
+# Comparar con una ejecución anterior guardada con --json. Devuelve las etapas
+# cuyo rendimiento ha bajado más de `tolerance`
+def compare(cases, baseline, tolerance):
+    previous = {(case["rows"], case["cache_ratio"]): case for case in baseline["cases"]}
+    regressions = []
+    for case in cases:
+        before = previous.get((case["rows"], case["cache_ratio"]))
+        if before is None:
+            continue
+        for name in STAGES:
+            old, new = before["stages"][name]["rows_per_sec"], case["stages"][name]["rows_per_sec"]
+            if new < old * (1 - tolerance):
+                regressions.append(
+                    f"{case['rows']} filas, caché {case['cache_ratio']:.0%}, {name}: {old:.0f} -> {new:.0f} filas/s"
+                )
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mide el rendimiento del procesamiento de ISBNs contra proveedores simulados en local.",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="Filas de cada libro sintético")
+    parser.add_argument(
+        "--cache-ratios", type=float, nargs="+", default=list(CACHE_RATIOS),
+        help="Proporciones de ISBNs que ya están en la base de datos",
+    )
+    parser.add_argument("--max-in-flight", type=int, default=lookup_engine.MAX_IN_FLIGHT)
+    parser.add_argument("--single-lookups", type=int, default=SINGLE_LOOKUPS)
+    parser.add_argument("--hit-rate", type=float, default=0.8, help="Proporción de ISBNs que conoce cada proveedor")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia mediana de los proveedores (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Dispersión log-normal de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Proporción de respuestas 503")
+    parser.add_argument(
+        "--server-rate", type=float, default=100.0, help="Peticiones por segundo que admite cada proveedor",
+    )
+    parser.add_argument(
+        "--client-rate", type=float, default=80.0,
+        help="Límite de peticiones por segundo del motor (el de producción es mucho menor)",
+    )
+    parser.add_argument("--no-memory", dest="trace_memory", action="store_false", help="No medir memoria")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="ARCHIVO", help="Guardar los resultados en JSON")
+    parser.add_argument("--compare", metavar="ARCHIVO", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Caída de filas/s que se considera regresión")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    stubs = [
+        ProviderStub(
+            provider, hit_rate=args.hit_rate, latency_median=args.latency, latency_sigma=args.latency_sigma,
+            rate_limit=(args.server_rate, args.server_rate), error_rate=args.error_rate, seed=args.seed,
+        ).start()
+        for provider in (GOOGLE_BOOKS, OPEN_LIBRARY)
+    ]
+    providers.GOOGLE_BOOKS_URL = stubs[0].url
+    providers.OPEN_LIBRARY_URL = stubs[1].url
+    lookup_engine.DEFAULT_RATE_LIMITS = {
+        provider: (args.client_rate, max(1, int(args.client_rate))) for provider in providers.PROVIDERS
+    }
+
+    if args.trace_memory:
+        tracemalloc.start()
+    workdir = tempfile.mkdtemp(prefix="isbn-bench-")
+    cases = []
+    try:
+        for rows in args.sizes:
+            for cache_ratio in args.cache_ratios:
+                cases.append(run_case(rows, cache_ratio, workdir, args))
+    finally:
+        for stub in stubs:
+            stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(cases, stubs)
+    try:
+        import resource
+        print(f"Memoria máxima del proceso: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    except ImportError:
+        pass
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "cases": cases}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(cases, json.load(f), args.tolerance)
+        if regressions:
+            print("Regresiones de rendimiento:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
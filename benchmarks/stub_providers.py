@@ -0,0 +1,175 @@
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from isbnlib import to_isbn10
+
+GOOGLE_BOOKS = "google_books"
+OPEN_LIBRARY = "open_library"
+
+MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June", "July",
+    "August", "September", "October", "November", "December",
+)
+
+# Número estable a partir de un ISBN y un proveedor, para que el mismo ISBN
+# tenga siempre la misma respuesta en cada proveedor
+def _isbn_hash(provider, isbn):
+    return zlib.crc32(f"{provider}:{isbn}".encode('ascii'))
+
+# Fecha de publicación sintética (año, mes, día) de un ISBN
+def synthetic_date(isbn):
+    number = int(isbn)
+    return 1950 + number % 75, 1 + number // 75 % 12, 1 + number // 900 % 28
+
+# Limitador de peticiones del servidor: responde 429 en lugar de esperar
+class _RateLimit:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+# Servidor HTTP local que imita las respuestas de Google Books u Open Library,
+# con latencia log-normal, límite de peticiones (429 con Retry-After) y una
+# proporción de errores 503. `hit_rate` es la proporción de ISBNs que conoce
+class ProviderStub:
+    def __init__(self, provider, hit_rate=0.8, latency_median=0.05, latency_sigma=0.5,
+                 rate_limit=None, error_rate=0.0, seed=0):
+        if provider not in (GOOGLE_BOOKS, OPEN_LIBRARY):
+            raise ValueError(f"Proveedor desconocido: {provider}")
+        self.provider = provider
+        self.hit_rate = hit_rate
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        # rate_limit = (peticiones por segundo, ráfaga) o None para no limitar
+        self.rate_limit = _RateLimit(*rate_limit) if rate_limit else None
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        if self.provider == GOOGLE_BOOKS:
+            return f"http://{host}:{port}/books/v1/volumes"
+        return f"http://{host}:{port}/api/books"
+
+    def knows(self, isbn):
+        return _isbn_hash(self.provider, isbn) % 10000 < self.hit_rate * 10000
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, headers, body = stub.handle(self.path)
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"stub-{self.provider}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    # Responder a una petición: (estado, cabeceras, cuerpo JSON)
+    def handle(self, path):
+        throttled = self.rate_limit is not None and not self.rate_limit.allow()
+        with self.lock:
+            self.requests += 1
+            self.throttled += throttled
+            latency = self.random.lognormvariate(0, self.latency_sigma) * self.latency_median
+            failed = not throttled and self.random.random() < self.error_rate
+            self.errors += failed
+        if throttled:
+            return 429, {"Retry-After": "1"}, {"error": "rate limit exceeded"}
+
+        time.sleep(latency)
+        if failed:
+            return 503, {}, {"error": "backend unavailable"}
+
+        query = parse_qs(urlparse(path).query)
+        if self.provider == GOOGLE_BOOKS:
+            return 200, {}, self._google_response(query)
+        return 200, {}, self._open_library_response(query)
+
+    def _google_response(self, query):
+        isbns = re.findall(r'isbn:(\d{13})', query.get("q", [""])[0])
+        max_results = int(query.get("maxResults", ["10"])[0])
+        items = []
+        for isbn in isbns:
+            if not self.knows(isbn):
+                continue
+            year, month, day = synthetic_date(isbn)
+            items.append({
+                "kind": "books#volume",
+                "volumeInfo": {
+                    "title": f"Libro {isbn}",
+                    "publishedDate": f"{year:04d}-{month:02d}-{day:02d}",
+                    "industryIdentifiers": [
+                        {"type": "ISBN_10", "identifier": to_isbn10(isbn) or ""},
+                        {"type": "ISBN_13", "identifier": isbn},
+                    ],
+                },
+            })
+        return {"kind": "books#volumes", "totalItems": len(items), "items": items[:max_results]}
+
+    def _open_library_response(self, query):
+        bibkeys = query.get("bibkeys", [""])[0].split(",")
+        books = {}
+        for bibkey in bibkeys:
+            isbn = bibkey.partition(":")[2]
+            if not isbn.isdigit() or not self.knows(isbn):
+                continue
+            year, month, day = synthetic_date(isbn)
+            books[bibkey] = {
+                "title": f"Libro {isbn}",
+                "publish_date": f"{MONTH_NAMES[month - 1]} {day}, {year}",
+            }
+        return books
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from isbn_store import ORIGIN_IMPORT, add_store_args, open_store
+from normalization import normalize_isbns
+from release_dates import date_precision
+from table_io import FORMATS, iter_chunks
+
+# Formatos de los listados de fechas que se pueden importar
+JSON = "json"
+FEED_FORMATS = (*FORMATS, JSON)
+
+# Qué hacer con un ISBN que ya tiene fecha en la base de datos
+KEEP = "keep"  # Dejar la fecha guardada
+OVERWRITE = "overwrite"  # Sustituirla por la del listado
+PRECISE = "precise"  # Quedarse con la más precisa (día > mes > año > texto sin interpretar)
+POLICIES = (KEEP, OVERWRITE, PRECISE)
+
+POLICY_LABELS = {
+    KEEP: "Mantener la fecha guardada",
+    OVERWRITE: "Sobrescribir con la del listado",
+    PRECISE: "Quedarse con la más precisa",
+}
+
+# Nombres de columna (en minúsculas) que se reconocen como ISBN y como fecha.
+# Si no aparecen, se usan la primera y la segunda columna
+ISBN_COLUMNS = ("isbn", "isbn13", "isbn_13", "isbn-13", "isbn10", "ean")
+DATE_COLUMNS = (
+    "fecha", "fecha de lanzamiento", "fecha_lanzamiento", "date", "release_date", "publication_date",
+    "published_date", "publishdate", "publish_date",
+)
+
+# Deducir el formato de un listado a partir del nombre del archivo
+def detect_feed_format(name):
+    extension = os.path.splitext(str(name))[1].lower().lstrip('.')
+    if extension not in FEED_FORMATS:
+        raise ValueError(f"Formato de archivo no admitido: .{extension}")
+    return extension
+
+def _pick_column(columns, names, default):
+    lowered = {str(column).strip().lower(): column for column in columns}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    return columns[default]
+
+# Columnas de ISBN y fecha de un listado, como texto
+def _feed_columns(df):
+    if df.shape[1] < 2:
+        raise ValueError("El listado debe tener una columna de ISBNs y otra de fechas.")
+    columns = list(df.columns)
+    isbn_column = _pick_column(columns, ISBN_COLUMNS, 0)
+    date_column = _pick_column([c for c in columns if c != isbn_column], DATE_COLUMNS, 0)
+    dates = df[date_column]
+    # Las celdas de fecha de Excel llegan como fechas, no como texto
+    if dates.dtype == object:
+        dates = dates.map(lambda value: value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else value)
+    elif pd.api.types.is_datetime64_any_dtype(dates):
+        dates = dates.dt.strftime('%Y-%m-%d')
+    return pd.DataFrame({
+        'isbn': df[isbn_column].astype(str).to_numpy(),
+        'date': dates.where(dates.notna(), '').astype(str).to_numpy(),
+    })
+
+# Leer un listado JSON: {isbn: fecha} (el formato de isbn_index.json), una
+# lista de objetos con ISBN y fecha o una lista de pares [isbn, fecha]
+def _read_json_feed(source):
+    if hasattr(source, 'read'):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        data = json.load(source)
+    else:
+        with open(source, encoding='utf-8') as f:
+            data = json.load(f)
+    if isinstance(data, dict):
+        return pd.DataFrame({'isbn': list(data), 'date': [str(date) for date in data.values()]})
+    if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+        return _feed_columns(pd.DataFrame(data))
+    if isinstance(data, list) and all(isinstance(item, (list, tuple)) and len(item) == 2 for item in data):
+        return _feed_columns(pd.DataFrame(data, columns=['isbn', 'date']))
+    raise ValueError("El JSON debe ser un objeto {isbn: fecha} o una lista de ISBNs con su fecha.")
+
+# Leer un listado de fechas. Devuelve un DataFrame con las columnas isbn y date
+def read_feed(source, feed_format):
+    if feed_format == JSON:
+        return _read_json_feed(source)
+    chunks = [_feed_columns(chunk) for chunk in iter_chunks(source, feed_format) if not chunk.empty]
+    if not chunks:
+        return pd.DataFrame({'isbn': [], 'date': []}, dtype=str)
+    return pd.concat(chunks, ignore_index=True)
+
+# Validar y normalizar un listado en bloque. Devuelve ({isbn13: fecha}, report).
+# Si un ISBN aparece varias veces se queda la fecha más precisa y, a igualdad,
+# la última
+def prepare_feed(feed):
+    dates = feed['date'].str.strip()
+    isbns = normalize_isbns(feed['isbn'].str.strip())
+    has_date = (dates != '') & (dates.str.lower() != 'nan')
+    valid = isbns['valid'].astype(bool) & has_date
+
+    rows = pd.DataFrame({'isbn': isbns.loc[valid, 'canonical'], 'date': dates[valid]})
+    # La precisión se calcula una vez por texto de fecha distinto
+    unique_dates = rows['date'].unique()
+    precision = dict(zip(unique_dates, map(date_precision, unique_dates)))
+    rows['precision'] = rows['date'].map(precision)
+    rows = rows.sort_values('precision', kind='stable').drop_duplicates('isbn', keep='last')
+
+    report = {
+        "rows": len(feed),
+        "invalid": int((~isbns['valid'].astype(bool)).sum()),
+        "empty_date": int((isbns['valid'].astype(bool) & ~has_date).sum()),
+        "duplicates": int(valid.sum()) - len(rows),
+    }
+    return dict(zip(rows['isbn'], rows['date'])), report
+
+# Función que decide qué fechas del listado se escriben según la política
+def _chooser(policy):
+    if policy == KEEP:
+        return lambda entries, existing: {
+            isbn: date for isbn, date in entries.items() if isbn not in existing
+        }
+    if policy == OVERWRITE:
+        return lambda entries, existing: {
+            isbn: date for isbn, date in entries.items() if existing.get(isbn) != date
+        }
+    if policy == PRECISE:
+        return lambda entries, existing: {
+            isbn: date for isbn, date in entries.items()
+            if isbn not in existing or date_precision(date) > date_precision(existing[isbn])
+        }
+    raise ValueError(f"Política de importación desconocida: {policy}")
+
+# Importar un listado en la base de datos en una sola transacción. Los ISBNs
+# importados salen de la caché negativa, así que los procesamientos siguientes
+# los resuelven sin consultar las APIs. Devuelve un resumen con el número de filas
+# leídas, no válidas, sin fecha y repetidas, y de ISBNs añadidos, actualizados,
+# conservados (con otra fecha) y sin cambios
+def import_feed(store, feed, policy=PRECISE):
+    entries, report = prepare_feed(feed)
+    written, existing = store.merge_many(entries, _chooser(policy), ORIGIN_IMPORT)
+    updated = sum(1 for isbn in written if isbn in existing)
+    unchanged = sum(1 for isbn, date in entries.items() if existing.get(isbn) == date)
+    report.update({
+        "added": len(written) - updated,
+        "updated": updated,
+        "kept": len(existing) - updated - unchanged,
+        "unchanged": unchanged,
+    })
+    return report
+
+# Texto del resumen de una importación
+def format_report(report):
+    return (
+        f"{report['rows']} filas leídas: {report['added']} ISBNs añadidos, {report['updated']} actualizados, "
+        f"{report['kept']} conservados con su fecha, {report['unchanged']} sin cambios, "
+        f"{report['invalid']} no válidos, {report['empty_date']} sin fecha y {report['duplicates']} repetidos"
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Importa un listado de ISBNs con su fecha de lanzamiento en la base de datos.")
+    parser.add_argument("feed", help="Listado de ISBNs y fechas (.xlsx, .xls, .csv, .parquet o .json)")
+    parser.add_argument(
+        "--policy", choices=POLICIES, default=PRECISE,
+        help=f"Qué hacer con los ISBNs que ya tienen fecha (por defecto {PRECISE})",
+    )
+    add_store_args(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = open_store(args)
+    try:
+        report = import_feed(store, read_feed(args.feed, detect_feed_format(args.feed)), args.policy)
+    except (OSError, ValueError) as e:
+        print(f"Error al importar el listado: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    print(format_report(report), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
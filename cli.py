@@ -0,0 +1,92 @@
+import argparse
+import sys
+import time
+
+from isbn_store import add_store_args, open_store
+from lookup_engine import MAX_IN_FLIGHT
+from metrics import METRICS, format_summary, snapshot_delta
+from processor import process_file
+from table_io import CHUNK_SIZE, detect_format
+
+# Segundos mínimos entre dos líneas de progreso
+PROGRESS_INTERVAL = 1.0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Añade la fecha de lanzamiento a los ISBNs de un archivo Excel, CSV o Parquet (columnas de ISBNs detectadas en cada hoja).",
+    )
+    parser.add_argument("input", help="Archivo de entrada (.xlsx, .xls, .csv o .parquet)")
+    parser.add_argument("output", help="Archivo de salida (.xlsx, .csv o .parquet)")
+    add_store_args(parser)
+    parser.add_argument(
+        "--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+        help=f"Búsquedas simultáneas en las APIs (por defecto {MAX_IN_FLIGHT})",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE,
+        help=f"Filas por bloque al leer y escribir (por defecto {CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--sheets", nargs="+", metavar="HOJA",
+        help="Hojas del Excel a procesar (por defecto, todas). Varias hojas requieren salida .xlsx",
+    )
+    parser.add_argument(
+        "--metrics", metavar="ARCHIVO",
+        help="Guardar los tiempos por etapa y los contadores (.prom para formato Prometheus, JSON en otro caso)",
+    )
+    parser.add_argument("--quiet", action="store_true", help="No mostrar el progreso")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = open_store(args)
+    last_report = [0.0]
+    metrics_before = METRICS.snapshot()
+
+    def log(text):
+        if not args.quiet:
+            print(text, file=sys.stderr)
+
+    def on_start(stats, keys_to_search):
+        log(
+            f"{stats['total']} ISBNs: {stats['from_cache']} en la base de datos, "
+            f"{stats['known_missing']} conocidos sin fecha, {stats['invalid']} no válidos, "
+            f"{len(keys_to_search)} distintos a buscar en API"
+        )
+
+    def on_progress(stats, processed, messages):
+        now = time.monotonic()
+        if now - last_report[0] >= PROGRESS_INTERVAL or stats["pending"] == 0:
+            last_report[0] = now
+            log(f"{processed}/{stats['total']} procesados, {stats['pending']} pendientes")
+
+    try:
+        stats, _, _ = process_file(
+            args.input, args.output, store,
+            input_format=detect_format(args.input), output_format=detect_format(args.output),
+            chunk_size=args.chunk_size, max_in_flight=args.max_in_flight,
+            on_start=on_start, on_progress=on_progress, sheets=args.sheets,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Error al procesar el archivo: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+
+    log(
+        f"Proceso completado: {stats['from_cache']} del caché, {stats['from_api']} de la API, "
+        f"{stats['not_found']} no encontrados, {stats['known_missing']} conocidos sin fecha, "
+        f"{stats['invalid']} no válidos"
+    )
+
+    # Tiempos por etapa y contadores de esta ejecución
+    metrics = snapshot_delta(metrics_before, METRICS.snapshot())
+    log(format_summary(metrics))
+    if args.metrics:
+        text = METRICS.to_prometheus(metrics) if args.metrics.endswith(".prom") else METRICS.to_json(metrics)
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+from release_dates import RAW, format_release_date, parse_release_date
+
+COMPACT_FILE = 'isbn_index.compact'
+
+# Cabecera del archivo: firma, longitud del JSON de metadatos y el propio JSON
+MAGIC = b'ISBNIDX1'
+_HEADER = struct.Struct('<8sQ')
+
+# Fecha tipada de cada ISBN. Si el texto no es una fecha ISO (2017-09-02, 2017-09
+# o 2017), `raw` apunta al texto original guardado en los metadatos (y vale -1
+# en el resto)
+DATE_DTYPE = np.dtype([
+    ('year', '<u2'), ('month', 'u1'), ('day', 'u1'), ('precision', 'u1'), ('raw', '<i4'),
+])
+
+# ISBNs por bloque al recorrer el índice entero
+ITER_BLOCK = 65536
+
+_ISBN13 = re.compile(r'\d{13}')
+
+def _isbn_number(isbn):
+    return int(isbn) if _ISBN13.fullmatch(isbn) else None
+
+def _align(offset, alignment=8):
+    return -offset % alignment
+
+# Escribir un índice compacto a partir de pares (isbn, fecha). Los ISBN-13 se
+# guardan como enteros de 64 bits ordenados y las fechas como año/mes/día con su
+# precisión; las claves que no son ISBN-13 se guardan aparte en los metadatos.
+# Solo se tipan las fechas que se vuelven a escribir igual: las demás ("02-09-17",
+# "2 de septiembre de 2017") se guardan como texto, para que el índice compacto
+# devuelva lo mismo que la base de datos.
+# Se escribe en un archivo temporal que luego sustituye al anterior.
+# `seq` es el número de cambio de la base de datos que refleja el archivo
+def write_compact_index(path, items, seq=0):
+    numbers = []
+    dates = []
+    extra = {}
+    raw = []
+    parsed = {}
+    for isbn, date in items:
+        isbn, date = str(isbn), str(date)
+        number = _isbn_number(isbn)
+        if number is None:
+            extra[isbn] = date
+            continue
+        # Las fechas se repiten mucho: se interpreta cada texto distinto una vez
+        if date not in parsed:
+            typed = parse_release_date(date)
+            if typed is None or format_release_date(*typed) != date:
+                raw.append(date)
+                typed = (0, 0, 0, RAW, len(raw) - 1)
+            else:
+                typed = typed + (-1,)
+            parsed[date] = typed
+        numbers.append(number)
+        dates.append(parsed[date])
+
+    isbns = np.array(numbers, dtype='<u8')
+    records = np.array(dates, dtype=DATE_DTYPE)
+    order = np.argsort(isbns, kind='stable')
+    isbns, records = isbns[order], records[order]
+
+    meta = json.dumps(
+        {"count": len(isbns), "seq": seq, "raw": raw, "extra": extra}, ensure_ascii=False,
+    ).encode('utf-8')
+    meta += b' ' * _align(_HEADER.size + len(meta))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(meta)))
+        f.write(meta)
+        f.write(isbns.tobytes())
+        f.write(records.tobytes())
+    os.replace(temp_path, path)
+
+# Índice de solo lectura sobre un archivo compacto. El archivo se proyecta en
+# memoria (mmap), así que abrirlo es instantáneo y solo se leen del disco las
+# páginas que tocan las búsquedas binarias
+class CompactIndex:
+    def __init__(self, isbns, records, raw=(), extra=None, seq=-1):
+        self.isbns = isbns
+        self.records = records
+        self.raw = list(raw)
+        self.extra = dict(extra or {})
+        self.seq = seq
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype='<u8'), np.empty(0, dtype=DATE_DTYPE))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, meta_size = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} no es un índice compacto de ISBNs")
+            meta = json.loads(f.read(meta_size).decode('utf-8'))
+        count = meta["count"]
+        offset = _HEADER.size + meta_size
+        if count == 0:
+            isbns, records = np.empty(0, dtype='<u8'), np.empty(0, dtype=DATE_DTYPE)
+        else:
+            isbns = np.memmap(path, dtype='<u8', mode='r', offset=offset, shape=(count,))
+            records = np.memmap(path, dtype=DATE_DTYPE, mode='r', offset=offset + isbns.nbytes, shape=(count,))
+        return cls(isbns, records, meta["raw"], meta["extra"], meta["seq"])
+
+    def _position(self, isbn):
+        number = _isbn_number(isbn)
+        if number is None:
+            return None
+        position = int(np.searchsorted(self.isbns, np.uint64(number)))
+        if position < len(self.isbns) and int(self.isbns[position]) == number:
+            return position
+        return None
+
+    def _format(self, year, month, day, precision, raw):
+        if precision == RAW:
+            return self.raw[raw]
+        return format_release_date(year, month, day, precision)
+
+    def get(self, isbn, default=None):
+        if isbn in self.extra:
+            return self.extra[isbn]
+        position = self._position(isbn)
+        if position is None:
+            return default
+        return self._format(*self.records[position].tolist())
+
+    def __getitem__(self, isbn):
+        date = self.get(isbn)
+        if date is None:
+            raise KeyError(isbn)
+        return date
+
+    def __contains__(self, isbn):
+        return isbn in self.extra or self._position(isbn) is not None
+
+    def __len__(self):
+        return len(self.isbns) + len(self.extra)
+
+    def __iter__(self):
+        for start in range(0, len(self.isbns), ITER_BLOCK):
+            for number in self.isbns[start:start + ITER_BLOCK].tolist():
+                yield f"{number:013d}"
+        yield from self.extra
+
+    # Recorrer todos los pares (isbn, fecha) por bloques para no cargar el archivo entero
+    def items(self):
+        formatted = {}
+        for start in range(0, len(self.isbns), ITER_BLOCK):
+            numbers = self.isbns[start:start + ITER_BLOCK].tolist()
+            records = self.records[start:start + ITER_BLOCK].tolist()
+            for number, record in zip(numbers, records):
+                if record not in formatted:
+                    formatted[record] = self._format(*record)
+                yield f"{number:013d}", formatted[record]
+        yield from self.extra.items()
+
+# Vista de lectura y escritura sobre un índice compacto: los cambios posteriores
+# al archivo se guardan en memoria (`overlay`) y los ISBNs borrados en `deleted`.
+# Ofrece la misma interfaz de diccionario que usa ISBNStore
+class LayeredIndex:
+    def __init__(self, base, overlay=None, deleted=None):
+        self.base = base
+        self.overlay = dict(overlay or {})
+        self.deleted = set(deleted or ())
+        self.deleted.difference_update(self.overlay)
+
+    def get(self, isbn, default=None):
+        if isbn in self.overlay:
+            return self.overlay[isbn]
+        if isbn in self.deleted:
+            return default
+        return self.base.get(isbn, default)
+
+    def __getitem__(self, isbn):
+        date = self.get(isbn)
+        if date is None:
+            raise KeyError(isbn)
+        return date
+
+    def __contains__(self, isbn):
+        return isbn in self.overlay or (isbn not in self.deleted and isbn in self.base)
+
+    def __len__(self):
+        added = sum(1 for isbn in self.overlay if isbn not in self.base)
+        removed = sum(1 for isbn in self.deleted if isbn in self.base)
+        return len(self.base) + added - removed
+
+    def __iter__(self):
+        for isbn, _ in self.items():
+            yield isbn
+
+    def items(self):
+        for isbn, date in self.base.items():
+            if isbn not in self.overlay and isbn not in self.deleted:
+                yield isbn, date
+        yield from self.overlay.items()
+
+    def update(self, entries):
+        self.overlay.update(entries)
+        self.deleted.difference_update(entries)
+
+    def pop(self, isbn, default=None):
+        date = self.get(isbn, default)
+        self.overlay.pop(isbn, None)
+        if isbn in self.base:
+            self.deleted.add(isbn)
+        return date
+
+    def clear(self):
+        self.base = CompactIndex.empty()
+        self.overlay.clear()
+        self.deleted.clear()
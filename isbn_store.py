@@ -0,0 +1,596 @@
+import json
+import os
+import sqlite3
+import time
+from threading import RLock, Thread
+
+from compact_index import COMPACT_FILE, CompactIndex, LayeredIndex, write_compact_index
+from release_dates import DAY, date_precision
+from search_index import SearchIndex
+
+DB_FILE = 'isbn_index.db'
+JSON_FILE = 'isbn_index.json'
+
+# Tipos de fallo que se guardan en la caché negativa
+MISS_NOT_FOUND = "not_found"  # Ningún proveedor tiene el ISBN
+MISS_ERROR = "error"  # Algún proveedor falló y ninguno lo encontró
+
+# Tiempo (en segundos) durante el que no se vuelve a buscar un ISBN fallido
+DEFAULT_MISS_TTLS = {
+    MISS_NOT_FOUND: 7 * 24 * 3600,
+    MISS_ERROR: 3600,
+}
+
+# Origen de cada fecha guardada. El refresco en segundo plano sustituye las que
+# vienen de las APIs y completa las antiguas (las del isbn_index.json y las
+# anteriores a la columna, que mezclan fechas de las APIs y escritas a mano) solo
+# con fechas más precisas; nunca toca las introducidas a mano ni las importadas
+ORIGIN_API = "api"
+ORIGIN_MANUAL = "manual"
+ORIGIN_IMPORT = "import"
+ORIGIN_LEGACY = "legacy"
+
+# Segundos que dura la reserva de un ISBN que se está buscando en las APIs; si
+# quien lo reservó no guarda el resultado en ese tiempo, otro puede buscarlo
+LEASE_TTL = 300
+
+# Cambios acumulados en memoria sobre el índice compacto a partir de los cuales
+# se vuelve a escribir el archivo
+COMPACT_THRESHOLD = 50000
+
+# Almacén persistente de ISBNs sobre SQLite en modo WAL. Cada escritura es una
+# transacción pequeña, así que añadir o borrar ISBNs no reescribe el índice entero.
+# Las lecturas se sirven desde una copia en memoria que solo se vuelve a cargar
+# cuando otra conexión (otro proceso) modifica la base de datos.
+# Los ISBNs que ningún proveedor resuelve se guardan aparte (caché negativa),
+# con una caducidad distinta según el tipo de fallo.
+# Varias sesiones y procesos pueden escribir a la vez sin perder resultados:
+# cada escritura inserta o actualiza solo sus filas, y SQLite serializa las
+# transacciones. Los ISBNs que se están buscando se reservan (tabla `lookups`)
+# para que ningún otro proceso los pida a la vez.
+# Con `compact_file` la copia en memoria no es un diccionario sino el índice
+# compacto proyectado en memoria más los cambios posteriores a él, que se leen de
+# la base de datos gracias al número de cambio (`seq`) de cada fila
+class ISBNStore:
+    def __init__(self, db_file=DB_FILE, json_file=JSON_FILE, miss_ttls=None, compact_file=None):
+        self.db_file = db_file
+        self.json_file = json_file
+        self.compact_file = compact_file
+        self._compact = None
+        self.miss_ttls = dict(DEFAULT_MISS_TTLS if miss_ttls is None else miss_ttls)
+        self.lock = RLock()
+        self._cache = None
+        self._misses = None
+        self._data_version = None
+        # Último número de cambio aplicado a la copia en memoria
+        self._seq = 0
+        self._search = None
+        self._search_building = False
+        # Se incrementa con cada cambio del índice, propio o de otra conexión
+        self.version = 0
+        # La conexión se comparte entre los hilos de Streamlit, protegida por el lock
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.create_function("date_precision", 1, date_precision, deterministic=True)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS isbns (isbn TEXT PRIMARY KEY, date TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS misses (isbn TEXT PRIMARY KEY, kind TEXT NOT NULL, checked_at REAL NOT NULL)"
+        )
+        # Número de cambio de cada fila y ISBNs borrados, para saber qué ha
+        # cambiado desde que se escribió el índice compacto
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(isbns)")]
+        if 'seq' not in columns:
+            self.conn.execute("ALTER TABLE isbns ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS isbns_seq ON isbns (seq)")
+        # Los fallos también llevan número de cambio, para leer solo los nuevos
+        if 'seq' not in [row[1] for row in self.conn.execute("PRAGMA table_info(misses)")]:
+            self.conn.execute("ALTER TABLE misses ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS misses_seq ON misses (seq)")
+        # Cuándo se obtuvo cada fecha y su precisión, para volver a buscar las
+        # antiguas o incompletas. Las filas anteriores no tienen fecha de obtención
+        if 'fetched_at' not in columns:
+            self.conn.execute("ALTER TABLE isbns ADD COLUMN fetched_at REAL")
+        if 'precision' not in columns:
+            self.conn.execute("ALTER TABLE isbns ADD COLUMN precision INTEGER")
+            self.conn.execute("UPDATE isbns SET precision = date_precision(date)")
+        # Las filas anteriores a esta columna no se sabe de dónde vienen
+        if 'origin' not in columns:
+            self.conn.execute(f"ALTER TABLE isbns ADD COLUMN origin TEXT NOT NULL DEFAULT '{ORIGIN_LEGACY}'")
+        # Veces que se ha pedido cada ISBN, para refrescar antes los más pedidos
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS requests (isbn TEXT PRIMARY KEY, count INTEGER NOT NULL, requested_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS deleted (isbn TEXT PRIMARY KEY, seq INTEGER NOT NULL)")
+        # ISBNs que algún proceso está buscando en las APIs en este momento
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS lookups (isbn TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._migrate_from_json()
+
+    # Importar una única vez el isbn_index.json existente
+    def _migrate_from_json(self):
+        with self.lock:
+            if self._get_meta('migrated_from_json') is not None:
+                return
+            data = {}
+            if self.json_file and os.path.exists(self.json_file):
+                with open(self.json_file, 'r', encoding='utf-8') as f:
+                    try:
+                        data = json.load(f)
+                    except json.JSONDecodeError:
+                        data = {}
+            with self.transaction() as cur:
+                cur.executemany(
+                    "INSERT OR IGNORE INTO isbns (isbn, date, precision, origin) VALUES (?, ?, date_precision(?), ?)",
+                    ((str(isbn), str(date), str(date), ORIGIN_LEGACY) for isbn, date in data.items()),
+                )
+                cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)", (str(len(data)),))
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # Reservar el siguiente número de cambio dentro de una transacción
+    def _next_seq(self, cur):
+        cur.execute(
+            "INSERT INTO meta (key, value) VALUES ('seq', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+        return int(cur.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0])
+
+    # Ejecutar varias sentencias en una transacción atómica
+    def transaction(self):
+        return _Transaction(self)
+
+    # Poner al día la copia en memoria si la base de datos ha cambiado desde otra
+    # conexión. Es una consulta muy barata cuando no hay cambios; si los hay, solo
+    # se leen las filas con número de cambio posterior al último aplicado. El
+    # índice entero solo se vuelve a cargar tras un borrado completo o si otro
+    # proceso ha reescrito el índice compacto
+    def refresh(self):
+        with self.lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._cache is not None and data_version == self._data_version:
+                return self
+            # El número de cambio se lee antes que las filas: lo que se confirme
+            # entre medias se vuelve a aplicar en la siguiente actualización
+            seq = int(self._get_meta('seq') or 0)
+            if self._cache is None or not self._apply_changes():
+                self._cache = self._load_index()
+                self._misses = {
+                    isbn: (kind, checked_at)
+                    for isbn, kind, checked_at in self.conn.execute("SELECT isbn, kind, checked_at FROM misses")
+                }
+                self.version += 1
+            self._seq = seq
+            self._data_version = data_version
+        return self
+
+    # Aplicar a la copia en memoria los cambios posteriores a self._seq. Devuelve
+    # False si no se puede y hay que volver a cargar el índice entero
+    def _apply_changes(self):
+        if int(self._get_meta('cleared_seq') or 0) > self._seq:
+            return False
+        if self.compact_file:
+            # Otro proceso ha reescrito el índice compacto (y purgado los borrados)
+            if self._compact is not None and os.path.exists(self.compact_file):
+                stat = os.stat(self.compact_file)
+                if self._compact[0] != (stat.st_mtime_ns, stat.st_size):
+                    return False
+            if len(self._cache.overlay) >= COMPACT_THRESHOLD:
+                return False
+        entries = dict(self.conn.execute("SELECT isbn, date FROM isbns WHERE seq > ?", (self._seq,)))
+        deleted = [row[0] for row in self.conn.execute("SELECT isbn FROM deleted WHERE seq > ?", (self._seq,))]
+        misses = self._miss_index()
+        misses.update(
+            (isbn, (kind, checked_at)) for isbn, kind, checked_at in self.conn.execute(
+                "SELECT isbn, kind, checked_at FROM misses WHERE seq > ?", (self._seq,),
+            )
+        )
+        if entries or deleted:
+            self._cache.update(entries)
+            for isbn in entries:
+                misses.pop(isbn, None)
+            for isbn in deleted:
+                self._cache.pop(isbn, None)
+            self.version += 1
+        return True
+
+    def _load_index(self):
+        if not self.compact_file:
+            return dict(self.conn.execute("SELECT isbn, date FROM isbns"))
+        base = self._load_compact()
+        # Tras un borrado completo el archivo ya no sirve
+        cleared = int(self._get_meta('cleared_seq') or 0)
+        if cleared > base.seq:
+            base = CompactIndex.empty()
+            base.seq = cleared
+        overlay = dict(self.conn.execute("SELECT isbn, date FROM isbns WHERE seq > ?", (base.seq,)))
+        if len(overlay) >= COMPACT_THRESHOLD or not os.path.exists(self.compact_file):
+            self.compact()
+            return self._load_index()
+        deleted = [row[0] for row in self.conn.execute("SELECT isbn FROM deleted WHERE seq > ?", (base.seq,))]
+        return LayeredIndex(base, overlay, deleted)
+
+    # Abrir el índice compacto, reutilizándolo mientras el archivo no cambie
+    def _load_compact(self):
+        if not os.path.exists(self.compact_file):
+            return CompactIndex.empty()
+        stat = os.stat(self.compact_file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._compact is None or self._compact[0] != signature:
+            self._compact = (signature, CompactIndex.load(self.compact_file))
+        return self._compact[1]
+
+    # Reescribir el índice compacto con el contenido actual de la base de datos
+    def compact(self):
+        if not self.compact_file:
+            return
+        with self.transaction() as cur:
+            seq = int(self._get_meta('seq') or 0)
+            # Soltar la proyección del archivo anterior antes de sustituirlo
+            self._compact = None
+            self._cache = None
+            write_compact_index(self.compact_file, cur.execute("SELECT isbn, date FROM isbns"), seq)
+            cur.execute("DELETE FROM deleted WHERE seq <= ?", (seq,))
+
+    def _index(self):
+        if self._cache is None:
+            self.refresh()
+        return self._cache
+
+    def _miss_index(self):
+        if self._misses is None:
+            self.refresh()
+        return self._misses
+
+    # Marcar un cambio hecho desde esta conexión
+    def _changed(self):
+        self.version += 1
+
+    def get(self, isbn, default=None):
+        return self._index().get(isbn, default)
+
+    def __getitem__(self, isbn):
+        return self._index()[isbn]
+
+    def __contains__(self, isbn):
+        return isbn in self._index()
+
+    def __len__(self):
+        return len(self._index())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return sorted(self._index())
+
+    def items(self):
+        return sorted(self._index().items())
+
+    def to_dict(self):
+        return dict(self._index().items())
+
+    # Escribir ISBNs dentro de una transacción ya abierta
+    def _write_entries(self, cur, entries, origin):
+        seq = self._next_seq(cur)
+        fetched_at = time.time()
+        cur.executemany(
+            "INSERT OR REPLACE INTO isbns (isbn, date, seq, fetched_at, precision, origin) "
+            "VALUES (?, ?, ?, ?, date_precision(?), ?)",
+            ((isbn, date, seq, fetched_at, date, origin) for isbn, date in entries.items()),
+        )
+        cur.executemany("DELETE FROM deleted WHERE isbn = ?", ((isbn,) for isbn in entries))
+        # Un ISBN con fecha deja de estar en la caché negativa y de estar reservado
+        cur.executemany("DELETE FROM misses WHERE isbn = ?", ((isbn,) for isbn in entries))
+        cur.executemany("DELETE FROM lookups WHERE isbn = ?", ((isbn,) for isbn in entries))
+
+    # Actualizar la copia en memoria tras confirmar la transacción
+    def _apply_entries(self, entries):
+        with self.lock:
+            self._index().update(entries)
+            misses = self._miss_index()
+            for isbn in entries:
+                misses.pop(isbn, None)
+            self._changed()
+
+    # Guardar o actualizar varios ISBNs en una sola transacción. `origin` indica
+    # de dónde vienen las fechas (ORIGIN_API, ORIGIN_MANUAL o ORIGIN_IMPORT)
+    def put_many(self, entries, origin=ORIGIN_API):
+        entries = dict(entries)
+        if not entries:
+            return
+        with self.transaction() as cur:
+            self._write_entries(cur, entries, origin)
+        # La copia en memoria solo se actualiza si la transacción se ha confirmado
+        self._apply_entries(entries)
+
+    # Guardar varios ISBNs decidiendo en la misma transacción qué pasa con los que
+    # ya tienen fecha: choose(nuevos, existentes) recibe {isbn: fecha} de los
+    # nuevos y de los que ya estaban guardados, y devuelve los que se escriben.
+    # Con `replaceable` solo se pueden sustituir las fechas con uno de esos
+    # orígenes; las demás se conservan sin consultar a `choose`.
+    # Devuelve (escritos, existentes)
+    def merge_many(self, entries, choose, origin=ORIGIN_API, replaceable=None):
+        entries = dict(entries)
+        if not entries:
+            return {}, {}
+        keys = list(entries)
+        with self.transaction() as cur:
+            existing = {}
+            protected = set()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                for isbn, date, row_origin in cur.execute(
+                    f"SELECT isbn, date, origin FROM isbns WHERE isbn IN ({', '.join('?' * len(chunk))})", chunk,
+                ):
+                    existing[isbn] = date
+                    if replaceable is not None and row_origin not in replaceable:
+                        protected.add(isbn)
+            entries = choose({isbn: date for isbn, date in entries.items() if isbn not in protected}, existing)
+            if entries:
+                self._write_entries(cur, entries, origin)
+        if entries:
+            self._apply_entries(entries)
+        return entries, existing
+
+    def put(self, isbn, date, origin=ORIGIN_API):
+        self.put_many({isbn: date}, origin)
+
+    # Marcar ISBNs como comprobados ahora sin cambiar su fecha (por ejemplo, si al
+    # refrescarlos los proveedores no devuelven nada mejor)
+    def touch_many(self, isbns, checked_at=None):
+        isbns = list(isbns)
+        if not isbns:
+            return
+        checked_at = time.time() if checked_at is None else checked_at
+        with self.transaction() as cur:
+            cur.executemany("UPDATE isbns SET fetched_at = ? WHERE isbn = ?", ((checked_at, isbn) for isbn in isbns))
+
+    # Sumar las veces que se ha pedido cada ISBN {isbn: veces}
+    def record_requests(self, counts, now=None):
+        counts = dict(counts)
+        if not counts:
+            return
+        now = time.time() if now is None else now
+        with self.transaction() as cur:
+            cur.executemany(
+                "INSERT INTO requests (isbn, count, requested_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (isbn) DO UPDATE SET count = count + excluded.count, requested_at = excluded.requested_at",
+                ((isbn, int(count), now) for isbn, count in counts.items()),
+            )
+
+    # ISBNs que conviene volver a buscar, los más pedidos primero: fechas de las
+    # APIs obtenidas antes de `stale_before`, fechas de las APIs o antiguas sin día
+    # comprobadas antes de `low_precision_before` y fallos de la caché negativa ya
+    # caducados. Las fechas escritas a mano o importadas nunca se proponen
+    def refresh_candidates(self, limit, stale_before, low_precision_before, now=None):
+        now = time.time() if now is None else now
+        expired = " OR ".join("(m.kind = ? AND m.checked_at < ?)" for _ in self.miss_ttls) or "0"
+        expired_params = [value for kind, ttl in self.miss_ttls.items() for value in (kind, now - ttl)]
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT isbn FROM ("
+                " SELECT i.isbn, COALESCE(r.count, 0) AS requested, COALESCE(i.fetched_at, 0) AS checked_at"
+                " FROM isbns i LEFT JOIN requests r ON r.isbn = i.isbn"
+                " WHERE (i.origin = ? AND COALESCE(i.fetched_at, 0) < ?)"
+                " OR (i.origin IN (?, ?) AND i.precision < ? AND COALESCE(i.fetched_at, 0) < ?)"
+                " UNION ALL"
+                " SELECT m.isbn, COALESCE(r.count, 0), m.checked_at"
+                " FROM misses m LEFT JOIN requests r ON r.isbn = m.isbn"
+                f" WHERE {expired}"
+                ") ORDER BY requested DESC, checked_at LIMIT ?",
+                (ORIGIN_API, stale_before, ORIGIN_API, ORIGIN_LEGACY, DAY, low_precision_before, *expired_params, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # Eliminar varios ISBNs en una sola transacción. Devuelve los que existían
+    def delete_many(self, isbns):
+        with self.transaction() as cur:
+            seq = self._next_seq(cur)
+            removed = [
+                isbn for isbn in isbns
+                if cur.execute("DELETE FROM isbns WHERE isbn = ?", (isbn,)).rowcount
+            ]
+            cur.executemany(
+                "INSERT OR REPLACE INTO deleted (isbn, seq) VALUES (?, ?)", ((isbn, seq) for isbn in removed),
+            )
+        with self.lock:
+            index = self._index()
+            for isbn in removed:
+                index.pop(isbn, None)
+            self._changed()
+        return removed
+
+    def clear(self):
+        with self.transaction() as cur:
+            seq = self._next_seq(cur)
+            cur.execute("DELETE FROM isbns")
+            cur.execute("DELETE FROM misses")
+            cur.execute("DELETE FROM deleted")
+            cur.execute("DELETE FROM lookups")
+            cur.execute("DELETE FROM requests")
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cleared_seq', ?)", (str(seq),))
+        with self.lock:
+            self._index().clear()
+            self._miss_index().clear()
+            self._changed()
+
+    # Registrar varios fallos {isbn: tipo} en la caché negativa
+    def put_misses(self, misses, checked_at=None):
+        misses = dict(misses)
+        if not misses:
+            return
+        checked_at = time.time() if checked_at is None else checked_at
+        with self.transaction() as cur:
+            seq = self._next_seq(cur)
+            cur.executemany(
+                "INSERT OR REPLACE INTO misses (isbn, kind, checked_at, seq) VALUES (?, ?, ?, ?)",
+                ((isbn, kind, checked_at, seq) for isbn, kind in misses.items()),
+            )
+            cur.executemany("DELETE FROM lookups WHERE isbn = ?", ((isbn,) for isbn in misses))
+        with self.lock:
+            self._miss_index().update({isbn: (kind, checked_at) for isbn, kind in misses.items()})
+
+    # Devolver el tipo de fallo de un ISBN si sigue vigente; None si no hay
+    # fallo registrado o ya ha caducado y hay que volver a buscarlo
+    def get_miss(self, isbn, now=None):
+        miss = self._miss_index().get(isbn)
+        if miss is None:
+            return None
+        kind, checked_at = miss
+        now = time.time() if now is None else now
+        if now - checked_at >= self.miss_ttls.get(kind, 0):
+            return None
+        return kind
+
+    # Resultado ya guardado de un ISBN: (fecha, encontrado), o None si no hay
+    def _outcome(self, isbn, now):
+        date = self.get(isbn)
+        if date is not None:
+            return date, True
+        if self.get_miss(isbn, now) is not None:
+            return "No encontrado", False
+        return None
+
+    # Reservar ISBNs para buscarlos en las APIs, de modo que ningún otro proceso
+    # los busque a la vez. Devuelve el conjunto de los reservados por `owner`; no
+    # se reservan los que tienen reserva vigente de otro ni los que ya tienen resultado
+    def claim_lookups(self, isbns, owner, ttl=LEASE_TTL, now=None):
+        now = time.time() if now is None else now
+        self.refresh()
+        isbns = [isbn for isbn in isbns if self._outcome(isbn, now) is None]
+        if not isbns:
+            return set()
+        with self.transaction() as cur:
+            cur.executemany(
+                "INSERT INTO lookups (isbn, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (isbn) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE lookups.owner = excluded.owner OR lookups.expires_at < ?",
+                ((isbn, owner, now + ttl, now) for isbn in isbns),
+            )
+            claimed = set()
+            for start in range(0, len(isbns), 500):
+                chunk = isbns[start:start + 500]
+                claimed.update(row[0] for row in cur.execute(
+                    f"SELECT isbn FROM lookups WHERE owner = ? AND isbn IN ({', '.join('?' * len(chunk))})",
+                    (owner, *chunk),
+                ))
+        return claimed
+
+    # Liberar reservas sin resultado (por ejemplo, si se interrumpe la búsqueda)
+    def release_lookups(self, isbns, owner):
+        isbns = list(isbns)
+        if not isbns:
+            return
+        with self.transaction() as cur:
+            cur.executemany(
+                "DELETE FROM lookups WHERE isbn = ? AND owner = ?", ((isbn, owner) for isbn in isbns),
+            )
+
+    # Estado de ISBNs reservados por otro: {isbn: (fecha, encontrado)} si ya hay
+    # resultado o None si la reserva ha caducado o se ha liberado sin resultado.
+    # Los que siguen en curso no aparecen
+    def lookup_outcomes(self, isbns, now=None):
+        now = time.time() if now is None else now
+        self.refresh()
+        outcomes = {}
+        with self.lock:
+            for isbn in isbns:
+                outcome = self._outcome(isbn, now)
+                if outcome is None:
+                    row = self.conn.execute("SELECT expires_at FROM lookups WHERE isbn = ?", (isbn,)).fetchone()
+                    if row is not None and row[0] >= now:
+                        continue
+                outcomes[isbn] = outcome
+        return outcomes
+
+    # Exportar el índice con el mismo formato que el antiguo isbn_index.json.
+    # Se lee de la base de datos fila a fila con una conexión propia, así que no
+    # carga el índice compacto en un diccionario ni bloquea a quien escribe
+    def export_json(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            lines = [
+                f"  {json.dumps(isbn, ensure_ascii=False)}: {json.dumps(date, ensure_ascii=False)}"
+                for isbn, date in conn.execute("SELECT isbn, date FROM isbns ORDER BY isbn")
+            ]
+        finally:
+            conn.close()
+        return "{\n" + ",\n".join(lines) + "\n}" if lines else "{}"
+
+    # Índice de búsqueda por prefijo y por fecha. La primera vez se construye al
+    # momento; después, cuando el índice cambia, se reconstruye en un hilo aparte
+    # y mientras tanto las búsquedas usan el anterior, así que escribir en la base
+    # de datos no hace esperar a quien busca
+    def search_index(self):
+        with self.lock:
+            if self._search is None:
+                self._search = (self.version, SearchIndex(self._index().items()))
+            elif self._search[0] != self.version and not self._search_building:
+                self._search_building = True
+                Thread(target=self._rebuild_search, name="search-index", daemon=True).start()
+            return self._search[1]
+
+    def _rebuild_search(self):
+        try:
+            # La copia se hace con el lock; ordenar e indexar, ya sin él
+            with self.lock:
+                version = self.version
+                items = list(self._index().items())
+            search = SearchIndex(items)
+            with self.lock:
+                if self._search is None or self._search[0] < version:
+                    self._search = (version, search)
+        finally:
+            self._search_building = False
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class _Transaction:
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        try:
+            self.cur = self.store.conn.cursor()
+            self.cur.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.store.lock.release()
+            raise
+        return self.cur
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.cur.execute("COMMIT")
+            else:
+                self.cur.execute("ROLLBACK")
+        finally:
+            self.cur.close()
+            self.store.lock.release()
+        return False
+
+# Opciones de línea de comandos para elegir la base de datos, comunes a todas las
+# herramientas que la usan (cli, bulk_import, lookup_service, refresh_scheduler)
+def add_store_args(parser):
+    parser.add_argument("--index", default=DB_FILE, help=f"Base de datos de ISBNs (por defecto {DB_FILE})")
+    parser.add_argument(
+        "--json-index", default=JSON_FILE,
+        help=f"isbn_index.json a importar la primera vez que se crea la base de datos (por defecto {JSON_FILE})",
+    )
+    parser.add_argument(
+        "--compact-index", metavar="ARCHIVO",
+        help=f"Usar un índice compacto proyectado en memoria; se crea si no existe ({COMPACT_FILE} es el que usa la aplicación)",
+    )
+    return parser
+
+# Abrir la base de datos elegida con las opciones de add_store_args
+def open_store(args):
+    return ISBNStore(args.index, args.json_index, compact_file=args.compact_index)
@@ -0,0 +1,332 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+
+from isbn_store import MISS_NOT_FOUND
+from lookup_engine import MAX_IN_FLIGHT
+from metrics import METRICS, snapshot_delta, snapshot_to_json
+from processor import MessageLog, check_output_format, empty_stats, resolve_isbns, summarize_file, write_dates
+
+JOBS_DB = 'jobs.db'
+UPLOADS_DIR = 'uploads'
+DOWNLOADS_DIR = 'downloads'
+
+# Estados de un trabajo
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+# Estado de cada ISBN distinto de un trabajo
+ROW_PENDING = "pending"
+ROW_FOUND = "found"
+ROW_NOT_FOUND = MISS_NOT_FOUND
+
+# Segundos entre comprobaciones de la cola cuando no hay trabajos
+POLL_INTERVAL = 1.0
+
+# Cada cuántos segundos un trabajador marca sus trabajos como vivos, y a partir
+# de cuántos sin marcar se da por muerto el proceso y el trabajo se retoma
+HEARTBEAT_INTERVAL = 10.0
+STALE_AFTER = 60.0
+
+# Registro persistente de trabajos en SQLite: archivo de entrada y salida,
+# estado, estadísticas, filas procesadas y el resultado de cada ISBN distinto
+# buscado en la API, que es el punto de control desde el que se retoma
+class JobStore:
+    def __init__(self, db_file=JOBS_DB):
+        self.db_file = db_file
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                input_path TEXT NOT NULL,
+                input_format TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                output_format TEXT NOT NULL,
+                max_in_flight INTEGER NOT NULL,
+                sheets TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                heartbeat_at REAL,
+                processed INTEGER NOT NULL DEFAULT 0,
+                searched INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                stats TEXT,
+                metrics TEXT,
+                error TEXT
+            )
+        """)
+        # Bases de datos creadas antes de guardar las métricas de cada trabajo
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "metrics" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN metrics TEXT")
+        if "sheets" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN sheets TEXT")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_rows (
+                job_id TEXT NOT NULL,
+                isbn TEXT NOT NULL,
+                status TEXT NOT NULL,
+                date TEXT,
+                PRIMARY KEY (job_id, isbn)
+            )
+        """)
+
+    # Transacción con el lock tomado; se deshace si algo falla
+    @contextmanager
+    def _transaction(self, mode="DEFERRED"):
+        with self.lock:
+            self.conn.execute(f"BEGIN {mode}")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _write(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params)
+
+    def _job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["stats"] = json.loads(job["stats"]) if job["stats"] else empty_stats()
+        job["sheets"] = json.loads(job["sheets"]) if job["sheets"] else None
+        return job
+
+    # Registrar un trabajo nuevo en la cola. `sheets` son las hojas a procesar
+    # (None para todas). Devuelve su identificador
+    def create(self, name, input_path, input_format, output_path, output_format,
+               max_in_flight=MAX_IN_FLIGHT, job_id=None, sheets=None):
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self._write(
+            "INSERT INTO jobs (id, name, status, input_path, input_format, output_path, output_format,"
+            " max_in_flight, sheets, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id, name, QUEUED, input_path, input_format, output_path, output_format, max_in_flight,
+                json.dumps(sheets) if sheets else None, now, now,
+            ),
+        )
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            return self._job(self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    # Trabajos más recientes primero
+    def recent(self, limit=20):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    # Tomar el trabajo en cola más antiguo, o uno en curso cuyo proceso dejó de
+    # dar señales de vida, y marcarlo como en curso
+    def claim(self, now=None):
+        now = time.time() if now is None else now
+        with self._transaction("IMMEDIATE") as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND COALESCE(heartbeat_at, 0) < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now - STALE_AFTER),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, now, now, row["id"]),
+                )
+        return self._job(row) if row is not None else None
+
+    def heartbeat(self, job_ids):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", ((now, job_id) for job_id in job_ids))
+
+    # Resultados ya obtenidos de una ejecución anterior: {isbn: (fecha, encontrado)}
+    def resolved_rows(self, job_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT isbn, status, date FROM job_rows WHERE job_id = ? AND status != ?", (job_id, ROW_PENDING),
+            ).fetchall()
+        return {row["isbn"]: (row["date"], row["status"] == ROW_FOUND) for row in rows}
+
+    # Registrar los ISBNs que hay que buscar en la API
+    def add_rows(self, job_id, isbns):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_rows (job_id, isbn, status) VALUES (?, ?, ?)",
+                ((job_id, isbn, ROW_PENDING) for isbn in isbns),
+            )
+            conn.execute(
+                "UPDATE jobs SET searched = (SELECT COUNT(*) FROM job_rows WHERE job_id = ?) WHERE id = ?",
+                (job_id, job_id),
+            )
+
+    # Guardar resultados {isbn: (fecha, encontrado)} y el progreso en una transacción
+    def checkpoint(self, job_id, results, processed, stats):
+        now = time.time()
+        with self._transaction() as conn:
+            completed = conn.executemany(
+                "UPDATE job_rows SET status = ?, date = ? WHERE job_id = ? AND isbn = ? AND status = ?",
+                (
+                    (ROW_FOUND if found else ROW_NOT_FOUND, date, job_id, isbn, ROW_PENDING)
+                    for isbn, (date, found) in results.items()
+                ),
+            ).rowcount
+            conn.execute(
+                "UPDATE jobs SET processed = ?, stats = ?, updated_at = ?, completed = completed + ? WHERE id = ?",
+                (processed, json.dumps(stats), now, max(completed, 0), job_id),
+            )
+
+    def finish(self, job_id, status, stats=None, error=None, metrics=None):
+        fields = {"status": status, "updated_at": time.time(), "error": error}
+        if stats is not None:
+            fields["stats"] = json.dumps(stats)
+        if metrics is not None:
+            fields["metrics"] = snapshot_to_json(metrics)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._write(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# Ruta del log de un trabajo
+def log_path(job):
+    return os.path.splitext(job["output_path"])[0] + ".log"
+
+# Últimas líneas de un archivo de texto sin leerlo entero
+def tail_lines(path, lines=10, block_size=8192):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        while end > 0 and data.count(b'\n') <= lines:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    return data.decode('utf-8', errors='replace').splitlines()[-lines:]
+
+# Ejecutar un trabajo de principio a fin. Los ISBNs ya resueltos en una
+# ejecución anterior (o ya guardados en la base de datos) no se vuelven a buscar
+def run_job(job, store, jobs):
+    job_id = job["id"]
+    # Las métricas son del proceso entero; las del trabajo son la diferencia.
+    # Si hay varios trabajadores a la vez, incluyen también lo que midan los otros
+    metrics_before = METRICS.snapshot()
+    summary, plan = summarize_file(job["input_path"], job["input_format"], sheets=job["sheets"])
+    check_output_format(plan, job["output_format"])
+
+    # Resultados de la ejecución anterior que no llegaron a la base de datos
+    resolved = jobs.resolved_rows(job_id)
+    store.put_many({isbn: date for isbn, (date, found) in resolved.items() if found and isbn not in store})
+
+    pending = {}
+
+    with open(log_path(job), 'a', encoding='utf-8') as log:
+        # El log completo va al archivo; en memoria solo quedan los últimos mensajes
+        messages = MessageLog(sink=log)
+
+        def on_start(stats, keys_to_search):
+            jobs.add_rows(job_id, keys_to_search)
+            jobs.checkpoint(job_id, {}, stats["total"] - stats["pending"], stats)
+            messages.flush()
+
+        def on_result(key, result):
+            pending[key] = (result.date, result.found)
+
+        def on_progress(stats, processed, messages):
+            jobs.checkpoint(job_id, pending, processed, stats)
+            pending.clear()
+            messages.flush()
+
+        dates_by_key, stats, _ = resolve_isbns(
+            summary, store, max_in_flight=job["max_in_flight"], resolved=resolved,
+            on_start=on_start, on_progress=on_progress, on_result=on_result, messages=messages,
+        )
+
+    write_dates(
+        job["input_path"], job["output_path"], dates_by_key, job["input_format"], job["output_format"], plan=plan,
+    )
+    jobs.finish(job_id, DONE, stats, metrics=snapshot_delta(metrics_before, METRICS.snapshot()))
+
+# Trabajadores que ejecutan los trabajos de la cola en hilos propios, fuera del
+# ciclo de recarga de Streamlit, así que cerrar o recargar la página no los para
+class JobRunner:
+    def __init__(self, store, jobs, workers=1, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.jobs = jobs
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.wakeup = Event()
+        self.active = set()
+        self.lock = Lock()
+        self.threads = []
+
+    def start(self):
+        if self.threads:
+            return self
+        for i in range(self.workers):
+            thread = Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        heartbeat = Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self.threads.append(heartbeat)
+        return self
+
+    # Poner en cola un archivo ya guardado en disco. Devuelve el identificador del trabajo
+    def submit(self, name, input_path, input_format, output_path, output_format, max_in_flight=MAX_IN_FLIGHT,
+               job_id=None, sheets=None):
+        job_id = self.jobs.create(
+            name, input_path, input_format, output_path, output_format, max_in_flight, job_id, sheets,
+        )
+        self.wakeup.set()
+        return job_id
+
+    # Si no hay ningún trabajo en curso en este proceso
+    def idle(self):
+        with self.lock:
+            return not self.active
+
+    def _work(self):
+        while True:
+            job = self.jobs.claim()
+            if job is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            with self.lock:
+                self.active.add(job["id"])
+            try:
+                run_job(job, self.store, self.jobs)
+            except Exception as e:
+                self.jobs.finish(job["id"], FAILED, error=str(e))
+            finally:
+                with self.lock:
+                    self.active.discard(job["id"])
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self.lock:
+                active = list(self.active)
+            if active:
+                self.jobs.heartbeat(active)
@@ -0,0 +1,260 @@
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from threading import Lock
+
+from provider_stats import PROVIDER_STATS, isbn_prefix
+from providers import (
+    BATCH_FETCHERS, BATCH_SIZES, GOOGLE_BOOKS, OPEN_LIBRARY, PROVIDERS,
+    LookupResult, canonical_isbn,
+)
+
+# Número máximo de búsquedas en curso a la vez
+MAX_IN_FLIGHT = 8
+
+# Límite por proveedor: (peticiones por segundo, ráfaga máxima)
+DEFAULT_RATE_LIMITS = {
+    GOOGLE_BOOKS: (5.0, 5),
+    OPEN_LIBRARY: (2.0, 2),
+}
+
+# Segundos entre comprobaciones de los ISBNs que está buscando otro proceso
+LEASE_POLL_INTERVAL = 1.0
+
+# Limitador de tipo token bucket compartido por todos los hilos
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    # Bloquear hasta que haya un token disponible y consumirlo
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Limitadores de los límites por defecto, compartidos por todos los motores del
+# proceso: varios trabajos y consultas a la vez no multiplican las peticiones
+RATE_LIMITERS = {provider: TokenBucket(rate, burst) for provider, (rate, burst) in DEFAULT_RATE_LIMITS.items()}
+
+# Búsquedas en curso en el proceso, para que varias sesiones que piden el mismo
+# ISBN a la vez compartan una sola petición. Quien reserva un ISBN lo busca y
+# publica el resultado; el resto espera a su Future
+class SingleFlight:
+    def __init__(self):
+        self.lock = Lock()
+        self.calls = {}
+
+    # Reservar ISBNs. Devuelve (propios, {isbn: Future} de los que ya busca otro)
+    def claim(self, isbns):
+        own, shared = [], {}
+        with self.lock:
+            for isbn in isbns:
+                if isbn in self.calls:
+                    shared[isbn] = self.calls[isbn]
+                else:
+                    self.calls[isbn] = Future()
+                    own.append(isbn)
+        return own, shared
+
+    # Publicar el resultado de un ISBN reservado
+    def resolve(self, isbn, result):
+        with self.lock:
+            future = self.calls.pop(isbn, None)
+        if future is not None:
+            future.set_result(result)
+
+    # Abandonar ISBNs reservados sin resultado: quien los esperaba recibe None
+    # y los busca por su cuenta
+    def release(self, isbns):
+        for isbn in isbns:
+            self.resolve(isbn, None)
+
+# Búsquedas en curso compartidas por todos los motores del proceso
+IN_FLIGHT = SingleFlight()
+
+# Motor de búsquedas concurrentes con un número limitado de peticiones en curso.
+# Sin `rate_limits` usa los limitadores compartidos del proceso (RATE_LIMITERS);
+# con ellos, unos propios.
+# Con `leases` (un ISBNStore) los ISBNs se reservan también en la base de datos
+# antes de cada lote, y los que está buscando otro proceso se esperan hasta que
+# su resultado aparece en ella en lugar de pedirlos otra vez
+class LookupEngine:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, rate_limits=None, stats=None, single_flight=None, leases=None,
+                 poll_interval=LEASE_POLL_INTERVAL):
+        self.max_in_flight = max(1, int(max_in_flight))
+        if rate_limits is None:
+            self.rate_limiters = RATE_LIMITERS
+        else:
+            self.rate_limiters = {
+                provider: TokenBucket(rate, burst) for provider, (rate, burst) in rate_limits.items()
+            }
+        self.stats = PROVIDER_STATS if stats is None else stats
+        self.single_flight = IN_FLIGHT if single_flight is None else single_flight
+        self.leases = leases
+        self.poll_interval = poll_interval
+        self.owner = uuid.uuid4().hex
+
+    # Consultar un lote de ISBNs en un proveedor respetando su límite de peticiones
+    # y registrando latencia y aciertos para ordenar los proveedores. `first` son
+    # los ISBNs del lote para los que este es el primer proveedor
+    def _fetch_batch(self, provider, isbns, first):
+        if provider in self.rate_limiters:
+            self.rate_limiters[provider].acquire()
+        started = time.monotonic()
+        try:
+            dates = BATCH_FETCHERS[provider](isbns)
+        except Exception:
+            self.stats.record(provider, isbns, (), time.monotonic() - started, first)
+            raise
+        self.stats.record(provider, isbns, dates, time.monotonic() - started, first)
+        return dates
+
+    # Reservar en la base de datos los ISBNs de un lote. Devuelve los propios;
+    # el resto los está buscando otro proceso y pasan a `remote`
+    def _lease(self, chunk, leased, remote):
+        if self.leases is None:
+            return chunk
+        owned = self.leases.claim_lookups(chunk, self.owner)
+        leased.update(owned)
+        remote.update(isbn for isbn in chunk if isbn not in owned)
+        return [isbn for isbn in chunk if isbn in owned]
+
+    # Buscar una lista de ISBNs. Devuelve pares (posición, resultado) según van
+    # terminando, para que quien llama pueda colocarlos en su fila original.
+    # Los ISBNs se agrupan en lotes por proveedor; cada ISBN empieza por el
+    # proveedor que mejor funciona para su grupo y, si no lo encuentra, pasa al
+    # siguiente de su lista. Los ISBNs que ya está buscando otra sesión u otro
+    # proceso no se piden otra vez: se espera a su resultado. `on_wait` se llama
+    # antes de cada espera por otro proceso, para que quien llama guarde los
+    # resultados que ese proceso pueda estar esperando a su vez
+    def lookup_many(self, isbns, on_wait=None):
+        positions = {}
+        for position, isbn in enumerate(isbns):
+            positions.setdefault(canonical_isbn(isbn), []).append(position)
+
+        # Orden de proveedores de cada ISBN (se calcula una vez por grupo; unos
+        # pocos ISBNs empiezan por otro proveedor para seguir midiéndolo)
+        orders_by_prefix = {}
+        orders = {}
+        for isbn in positions:
+            prefix = isbn_prefix(isbn, self.stats.prefix_length)
+            if prefix not in orders_by_prefix:
+                orders_by_prefix[prefix] = self.stats.provider_order(isbn, PROVIDERS)
+            orders[isbn] = self.stats.explore(orders_by_prefix[prefix])
+        next_stage = dict.fromkeys(positions, 0)
+
+        errors = {}
+        # ISBNs esperando a completar un lote para cada proveedor
+        buffers = {provider: [] for provider in PROVIDERS}
+        # Peticiones en curso: Future -> (proveedor, lote). Los ISBNs que busca
+        # otra sesión del proceso se esperan con su Future y proveedor None
+        pending = {}
+        own, shared = self.single_flight.claim(list(positions))
+        for isbn in own:
+            buffers[orders[isbn][0]].append(isbn)
+        for isbn, future in shared.items():
+            pending[future] = (None, [isbn])
+        unresolved = set(own)
+        # ISBNs reservados en la base de datos y los que está buscando otro proceso
+        leased = set()
+        remote = set()
+
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            while True:
+                # Lanzar los lotes completos y, si ningún otro proveedor puede
+                # enviar más ISBNs a este, también el lote incompleto que quede
+                for provider in PROVIDERS:
+                    size = BATCH_SIZES[provider]
+                    buffer = buffers[provider]
+                    others_busy = any(p is not None and p != provider for p, _ in pending.values())
+                    while len(buffer) >= size or (buffer and not others_busy):
+                        chunk, buffer = buffer[:size], buffer[size:]
+                        chunk = self._lease(chunk, leased, remote)
+                        if chunk:
+                            first = [isbn for isbn in chunk if next_stage[isbn] == 0]
+                            pending[pool.submit(self._fetch_batch, provider, chunk, first)] = (provider, chunk)
+                    buffers[provider] = buffer
+
+                if not pending and not remote:
+                    break
+
+                if remote and on_wait:
+                    on_wait()
+
+                results = []
+                if pending:
+                    done, _ = wait(pending, timeout=self.poll_interval if remote else None, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    time.sleep(self.poll_interval)
+
+                for future in done:
+                    provider, chunk = pending.pop(future)
+                    if provider is None:
+                        # Resultado de otra sesión; None si la abandonó sin terminar
+                        isbn = chunk[0]
+                        result = future.result()
+                        if result is not None:
+                            results.append((isbn, result))
+                            continue
+                        claimed, shared = self.single_flight.claim([isbn])
+                        if claimed:
+                            unresolved.add(isbn)
+                            buffers[orders[isbn][0]].append(isbn)
+                        else:
+                            pending[shared[isbn]] = (None, [isbn])
+                        continue
+
+                    try:
+                        dates = future.result()
+                    except Exception as e:
+                        # Si falla el lote, todos sus ISBNs pasan al siguiente proveedor
+                        dates = {}
+                        for isbn in chunk:
+                            errors[isbn] = e
+
+                    for isbn in chunk:
+                        next_stage[isbn] += 1
+                        if isbn in dates:
+                            results.append((isbn, LookupResult(isbn, dates[isbn], True, None)))
+                        elif next_stage[isbn] < len(orders[isbn]):
+                            buffers[orders[isbn][next_stage[isbn]]].append(isbn)
+                        else:
+                            results.append((isbn, LookupResult(isbn, "No encontrado", False, errors.get(isbn))))
+
+                # Comprobar si otro proceso ya ha guardado los ISBNs que estaba buscando.
+                # Si su reserva ha caducado sin resultado, se buscan aquí
+                if remote:
+                    for isbn, outcome in self.leases.lookup_outcomes(list(remote)).items():
+                        remote.discard(isbn)
+                        if outcome is None:
+                            buffers[orders[isbn][next_stage[isbn]]].append(isbn)
+                        else:
+                            date, found = outcome
+                            results.append((isbn, LookupResult(isbn, date, found, None)))
+
+                for isbn, result in results:
+                    if isbn in unresolved:
+                        unresolved.discard(isbn)
+                        self.single_flight.resolve(isbn, result)
+                    for position in positions[isbn]:
+                        yield position, result
+        finally:
+            # Si se abandona la iteración, no lanzar las búsquedas que quedan y
+            # liberar los ISBNs reservados para que los busque otra sesión
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.single_flight.release(unresolved)
+            if self.leases is not None:
+                self.leases.release_lookups([isbn for isbn in leased if isbn in unresolved], self.owner)
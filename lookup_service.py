@@ -0,0 +1,250 @@
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from urllib.parse import parse_qs, unquote, urlparse
+
+from isbn_store import MISS_ERROR, MISS_NOT_FOUND, add_store_args, open_store
+from lookup_engine import LookupEngine, MAX_IN_FLIGHT
+from metrics import METRICS
+from normalization import normalize_isbn
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8502
+
+# Máximo de ISBNs en una consulta por lotes y tamaño máximo del cuerpo (bytes)
+MAX_BATCH = 10000
+MAX_BODY = 1024 * 1024
+
+# Segundos entre dos comprobaciones de cambios hechos en la base de datos por
+# otros procesos (la aplicación, la línea de comandos, trabajos)
+REFRESH_INTERVAL = 1.0
+
+# Segundos entre dos escrituras de las veces que se ha pedido cada ISBN (se
+# acumulan en memoria para no escribir en la base de datos en cada consulta)
+REQUESTS_FLUSH_INTERVAL = 60.0
+
+# Origen de cada respuesta
+SOURCE_CACHE = "cache"
+SOURCE_KNOWN_MISSING = "known_missing"
+SOURCE_API = "api"
+SOURCE_MISS = "miss"
+SOURCE_INVALID = "invalid"
+
+# Consultas de fechas sobre el índice: los aciertos salen de la copia en memoria
+# del ISBNStore y los fallos se buscan con el motor de búsquedas. Los límites de
+# peticiones se comparten con los demás motores del mismo proceso; las reservas
+# y la caché negativa, a través de la base de datos, con el resto de la aplicación.
+# Los cambios de otros procesos y las veces que se pide cada ISBN se sincronizan
+# con la base de datos en un hilo aparte (start), nunca en el de una consulta
+class LookupService:
+    def __init__(self, store, max_in_flight=MAX_IN_FLIGHT, refresh_interval=REFRESH_INTERVAL):
+        self.store = store
+        self.engine = LookupEngine(max_in_flight=max_in_flight, leases=store)
+        self.refresh_interval = refresh_interval
+        self.requested = Counter()
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(target=self._run, name="lookup-service-refresh", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        flushed_at = time.monotonic()
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                self.store.refresh()
+                if time.monotonic() - flushed_at >= REQUESTS_FLUSH_INTERVAL:
+                    self.flush_requests()
+                    flushed_at = time.monotonic()
+            except Exception:
+                # Un fallo de la base de datos no debe parar el hilo; se reintenta en la siguiente vuelta
+                METRICS.inc("service_refresh_errors_total")
+
+    # Guardar las veces que se ha pedido cada ISBN desde la última escritura
+    def flush_requests(self):
+        with self.lock:
+            requested, self.requested = self.requested, Counter()
+        self.store.record_requests(requested)
+
+    # Respuesta de un ISBN ya normalizado que está en el índice o en la caché
+    # negativa; None si hay que buscarlo en las APIs
+    def _cached(self, isbn, clean, canonical, valid):
+        result = {"isbn": isbn, "canonical": canonical, "valid": valid, "date": None, "found": False}
+        if not valid:
+            return {**result, "source": SOURCE_INVALID}
+        date = self.store.get(canonical)
+        if date is None and clean != canonical:
+            date = self.store.get(clean)
+        if date is not None:
+            return {**result, "date": date, "found": True, "source": SOURCE_CACHE}
+        if self.store.get_miss(canonical) is not None:
+            return {**result, "date": "No encontrado", "source": SOURCE_KNOWN_MISSING}
+        return None
+
+    # Consultar una lista de ISBNs. Devuelve un resultado por ISBN, en el mismo
+    # orden. Con `resolve=False` los que no están en el índice no se buscan
+    def lookup(self, isbns, resolve=True):
+        results = [None] * len(isbns)
+        misses = {}
+        for position, isbn in enumerate(isbns):
+            clean, canonical, valid = normalize_isbn(isbn)
+            result = self._cached(isbn, clean, canonical, valid)
+            if result is None:
+                misses.setdefault(canonical, []).append(position)
+                result = {"isbn": isbn, "canonical": canonical, "valid": True, "date": None, "found": False,
+                          "source": SOURCE_MISS}
+            results[position] = result
+        requested = Counter(result["canonical"] for result in results if result["valid"])
+        with self.lock:
+            self.requested.update(requested)
+
+        if misses and resolve:
+            keys = list(misses)
+            found = {}
+            failed = {}
+
+            # Guardar los resultados pendientes al terminar y también mientras el
+            # motor espera ISBNs que busca otro proceso, por si ese proceso espera
+            # a su vez alguno de los nuestros
+            def flush():
+                with METRICS.timer("service_persist_seconds"):
+                    self.store.put_misses(failed)
+                    self.store.put_many(found)
+                found.clear()
+                failed.clear()
+
+            for position, result in self.engine.lookup_many(keys, on_wait=flush):
+                key = keys[position]
+                if result.found:
+                    found[key] = result.date
+                else:
+                    failed[key] = MISS_ERROR if result.error is not None else MISS_NOT_FOUND
+                for i in misses[key]:
+                    results[i].update(date=result.date, found=result.found, source=SOURCE_API)
+            flush()
+
+        for source, count in Counter(result["source"] for result in results).items():
+            METRICS.inc("service_lookups_total", count, source=source)
+        return results
+
+# Servidor HTTP/1.1 con conexiones persistentes. Rutas:
+#   GET  /isbn/<isbn>[?resolve=0]   un ISBN
+#   POST /isbns[?resolve=0]         lista JSON de ISBNs, o {"isbns": [...]}
+#   GET  /health                    estado y número de ISBNs en el índice
+#   GET  /metrics                   métricas del proceso en formato Prometheus
+class LookupHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Enviar cada respuesta en cuanto está lista, sin esperar a juntar paquetes
+    disable_nagle_algorithm = True
+    service = None
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        return status
+
+    def _error(self, status, message):
+        return self._send(status, {"error": message})
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        resolve = parse_qs(url.query).get("resolve", ["1"])[-1] not in ("0", "false", "no")
+        started = time.perf_counter()
+        endpoint = url.path
+        if method == "GET" and url.path.startswith("/isbn/"):
+            endpoint = "/isbn"
+            status = self._send(200, self.service.lookup([unquote(url.path[len("/isbn/"):])], resolve)[0])
+        elif method == "POST" and url.path == "/isbns":
+            status = self._batch(resolve)
+        elif method == "GET" and url.path == "/health":
+            status = self._send(200, {"status": "ok", "isbns": len(self.service.store)})
+        elif method == "GET" and url.path == "/metrics":
+            status = self._send(200, METRICS.to_prometheus().encode('utf-8'), "text/plain; version=0.0.4")
+        else:
+            endpoint = "other"
+            # El cuerpo de una petición desconocida no se lee: cerrar la conexión
+            self.close_connection = method == "POST"
+            status = self._error(404, f"Ruta no encontrada: {method} {url.path}")
+        METRICS.observe("service_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+        METRICS.inc("service_requests_total", endpoint=endpoint, status=status)
+
+    def _batch(self, resolve):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            # No se lee el cuerpo, así que la conexión no se puede reutilizar
+            self.close_connection = True
+            return self._error(413, f"El cuerpo supera {MAX_BODY} bytes")
+        try:
+            data = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            return self._error(400, f"JSON no válido: {e}")
+        isbns = data.get("isbns") if isinstance(data, dict) else data
+        if not isinstance(isbns, list) or not all(isinstance(isbn, (str, int)) for isbn in isbns):
+            return self._error(400, 'Se esperaba una lista de ISBNs o {"isbns": [...]}')
+        if len(isbns) > MAX_BATCH:
+            return self._error(413, f"Se admiten como máximo {MAX_BATCH} ISBNs por consulta")
+        return self._send(200, {"results": self.service.lookup([str(isbn) for isbn in isbns], resolve)})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+# Crear el servidor (sin arrancarlo) para un servicio de consultas
+def make_server(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    handler = type("Handler", (LookupHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de consulta de fechas de lanzamiento por ISBN.")
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"Dirección en la que escuchar (por defecto {SERVICE_HOST})")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help=f"Puerto (por defecto {SERVICE_PORT})")
+    add_store_args(parser)
+    parser.add_argument(
+        "--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+        help=f"Búsquedas simultáneas en las APIs por consulta (por defecto {MAX_IN_FLIGHT})",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = open_store(args)
+    service = LookupService(store, args.max_in_flight).start()
+    server = make_server(service, args.host, args.port)
+    print(f"Sirviendo {len(store)} ISBNs en http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        service.flush_requests()
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
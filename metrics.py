@@ -0,0 +1,194 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+# Límites (en segundos) de los tramos de los histogramas de tiempos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+# Prefijo de las métricas exportadas en formato Prometheus
+PREFIX = "isbn_"
+
+# Etapas del procesamiento que se miden
+STAGE_PARSE = "parse"
+STAGE_NORMALIZE = "normalize"
+STAGE_CACHE = "cache_lookup"
+STAGE_API = "api_lookup"
+STAGE_PERSIST = "persist"
+STAGE_EXPORT = "export"
+STAGES = (STAGE_PARSE, STAGE_NORMALIZE, STAGE_CACHE, STAGE_API, STAGE_PERSIST, STAGE_EXPORT)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+# Contadores e histogramas de tiempos con etiquetas, compartidos por todos los
+# hilos. Cada medida es una suma bajo un lock, así que cuesta muy poco
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)}
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+
+    # Medir la duración de un bloque:  with METRICS.timer("stage_seconds", stage="parse"): ...
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # Copia de los valores actuales, para calcular después lo que ha cambiado
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    key: {"count": h["count"], "sum": h["sum"], "buckets": list(h["buckets"])}
+                    for key, h in self.histograms.items()
+                },
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_json(self, snapshot=None):
+        return snapshot_to_json(self.snapshot() if snapshot is None else snapshot)
+
+    def to_prometheus(self, snapshot=None):
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        lines = []
+        typed = set()
+
+        def labels_text(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{labels_text(labels)} {value}")
+
+        for (name, labels), histogram in sorted(snapshot["histograms"].items()):
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(f"{metric}_bucket{labels_text(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{metric}_sum{labels_text(labels)} {histogram['sum']}")
+            lines.append(f"{metric}_count{labels_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Diferencia entre dos instantáneas: lo medido durante un procesamiento
+def snapshot_delta(before, after):
+    counters = {
+        key: value - before["counters"].get(key, 0)
+        for key, value in after["counters"].items()
+        if value != before["counters"].get(key, 0)
+    }
+    histograms = {}
+    for key, histogram in after["histograms"].items():
+        previous = before["histograms"].get(key)
+        if previous is None:
+            histograms[key] = histogram
+        elif histogram["count"] != previous["count"]:
+            histograms[key] = {
+                "count": histogram["count"] - previous["count"],
+                "sum": histogram["sum"] - previous["sum"],
+                "buckets": [a - b for a, b in zip(histogram["buckets"], previous["buckets"])],
+            }
+    return {"counters": counters, "histograms": histograms}
+
+# Instantánea en JSON (las claves con etiquetas pasan a ser listas de objetos)
+def snapshot_to_json(snapshot):
+    return json.dumps({
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(snapshot["counters"].items())
+        ],
+        "histograms": [
+            {"name": name, "labels": dict(labels), **histogram}
+            for (name, labels), histogram in sorted(snapshot["histograms"].items())
+        ],
+    }, indent=2)
+
+def snapshot_from_json(text):
+    data = json.loads(text)
+    return {
+        "counters": {
+            (item["name"], tuple(sorted(item["labels"].items()))): item["value"] for item in data["counters"]
+        },
+        "histograms": {
+            (item["name"], tuple(sorted(item["labels"].items()))): {
+                "count": item["count"], "sum": item["sum"], "buckets": item["buckets"],
+            }
+            for item in data["histograms"]
+        },
+    }
+
+# Resumen legible de una instantánea: una fila por etapa y por proveedor con el
+# número de medidas, el tiempo total y el medio, más los contadores
+def summarize(snapshot):
+    rows = []
+    for (name, labels), histogram in sorted(snapshot["histograms"].items()):
+        labels = dict(labels)
+        count = histogram["count"]
+        rows.append({
+            "metric": name,
+            "labels": ", ".join(f"{k}={v}" for k, v in labels.items()),
+            "count": count,
+            "total_seconds": histogram["sum"],
+            "mean_seconds": histogram["sum"] / count if count else 0.0,
+        })
+    counters = {
+        name + (f"[{', '.join(f'{k}={v}' for k, v in labels)}]" if labels else ""): value
+        for (name, labels), value in sorted(snapshot["counters"].items())
+    }
+    return rows, counters
+
+# Texto del resumen para la línea de comandos
+def format_summary(snapshot):
+    rows, counters = summarize(snapshot)
+    lines = []
+    for row in rows:
+        label = f"{row['metric']} {row['labels']}".strip()
+        lines.append(f"{label:<45} {row['count']:>8} veces {row['total_seconds']:>9.2f} s {row['mean_seconds'] * 1000:>9.1f} ms/vez")
+    for name, value in counters.items():
+        lines.append(f"{name:<45} {value:>8}")
+    return "\n".join(lines)
+
+# Métricas compartidas por todo el proceso
+METRICS = Metrics()
@@ -0,0 +1,88 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Pesos para el dígito de control de ISBN-13 (1, 3, 1, 3...) e ISBN-10 (10, 9, ... 2)
+ISBN13_WEIGHTS = np.array([1, 3] * 6 + [1], dtype=np.int64)
+ISBN10_WEIGHTS = np.arange(10, 1, -1, dtype=np.int64)
+
+# Convertir una lista de cadenas de la misma longitud en una matriz de dígitos
+def _digit_matrix(values, length):
+    if len(values) == 0:
+        return np.empty((0, length), dtype=np.int64)
+    raw = np.frombuffer(''.join(values).encode('ascii'), dtype=np.uint8)
+    return raw.reshape(-1, length).astype(np.int64) - ord('0')
+
+_NOT_ISBN_CHARS = re.compile(r'[^0-9Xx]')
+
+# Limpiar una columna de ISBNs: solo dígitos y la X final de los ISBN-10
+def clean_isbns(series):
+    return series.astype(str).fillna('').str.replace(r'[^0-9Xx]', '', regex=True).str.upper()
+
+# Normalizar una columna de ISBNs en bloque. Devuelve un DataFrame con:
+#   - clean: el ISBN limpio, tal y como se buscaba antes en el índice
+#   - canonical: el ISBN-13 si el ISBN es válido; si no, el ISBN limpio
+#   - valid: si el dígito de control es correcto y, en los ISBN-13, empieza por
+#     978 o 979 (el resto de códigos EAN de 13 dígitos no son ISBNs)
+def normalize_isbns(series):
+    clean = clean_isbns(series)
+    canonical = clean.copy()
+    valid = pd.Series(False, index=clean.index)
+
+    # ISBN-13: 978 o 979 y 10 dígitos más, con suma ponderada múltiplo de 10
+    mask13 = clean.str.fullmatch(r'97[89]\d{10}').fillna(False).astype(bool)
+    if mask13.any():
+        digits = _digit_matrix(clean[mask13].tolist(), 13)
+        valid[mask13] = (digits @ ISBN13_WEIGHTS) % 10 == 0
+
+    # ISBN-10: 9 dígitos más un dígito o X, con suma ponderada múltiplo de 11
+    mask10 = clean.str.fullmatch(r'\d{9}[\dX]').fillna(False).astype(bool)
+    if mask10.any():
+        values = clean[mask10]
+        body = _digit_matrix(values.str[:9].tolist(), 9)
+        check = values.str[9].map(lambda c: 10 if c == 'X' else int(c)).to_numpy(dtype=np.int64)
+        ok = (body @ ISBN10_WEIGHTS + check) % 11 == 0
+        valid[mask10] = ok
+
+        # Convertir los ISBN-10 válidos a ISBN-13 (prefijo 978 y nuevo dígito de control)
+        if ok.any():
+            body13 = np.hstack([np.tile([9, 7, 8], (int(ok.sum()), 1)), body[ok]])
+            check13 = (10 - (body13 @ ISBN13_WEIGHTS[:12]) % 10) % 10
+            prefixes = ('978' + values[ok].str[:9]).to_numpy()
+            canonical[values[ok].index] = [p + str(c) for p, c in zip(prefixes, check13)]
+
+    return pd.DataFrame({'clean': clean, 'canonical': canonical, 'valid': valid})
+
+# Proporción mínima de valores no vacíos con dígito de control correcto para
+# considerar que una columna es de ISBNs
+ISBN_COLUMN_MIN_RATIO = 0.5
+
+# Detectar las columnas de ISBNs de un bloque de filas. Cada columna se comprueba
+# en bloque con normalize_isbns; las celdas vacías no cuentan. Las columnas de
+# códigos EAN de otros productos no se detectan, porque no empiezan por 978 o 979
+def detect_isbn_columns(df, min_ratio=ISBN_COLUMN_MIN_RATIO):
+    columns = []
+    for column in df.columns:
+        values = df[column].dropna().astype(str).str.strip()
+        values = values[values != '']
+        if not values.empty and normalize_isbns(values)['valid'].mean() >= min_ratio:
+            columns.append(column)
+    return columns
+
+# Normalizar un único ISBN sin pasar por pandas, para consultas sueltas donde
+# importa la latencia. Devuelve (limpio, canónico, válido) con las mismas reglas
+# que normalize_isbns
+def normalize_isbn(isbn):
+    clean = _NOT_ISBN_CHARS.sub('', str(isbn)).upper()
+    if len(clean) == 13 and clean.isdigit() and clean[:3] in ('978', '979'):
+        total = sum(int(c) * w for c, w in zip(clean, (1, 3) * 6 + (1,)))
+        return clean, clean, total % 10 == 0
+    if len(clean) == 10 and clean[:9].isdigit() and (clean[9].isdigit() or clean[9] == 'X'):
+        check = 10 if clean[9] == 'X' else int(clean[9])
+        if (sum(int(c) * w for c, w in zip(clean, range(10, 1, -1))) + check) % 11 != 0:
+            return clean, clean, False
+        body = '978' + clean[:9]
+        check13 = (10 - sum(int(c) * w for c, w in zip(body, (1, 3) * 6)) % 10) % 10
+        return clean, body + str(check13), True
+    return clean, clean, False
@@ -0,0 +1,392 @@
+import os
+import time
+from collections import deque
+
+import pandas as pd
+
+from isbn_store import MISS_ERROR, MISS_NOT_FOUND
+from lookup_engine import LookupEngine, MAX_IN_FLIGHT
+from metrics import METRICS, STAGE_API, STAGE_CACHE, STAGE_EXPORT, STAGE_NORMALIZE, STAGE_PARSE, STAGE_PERSIST
+from normalization import detect_isbn_columns, normalize_isbns
+from table_io import CHUNK_SIZE, EXCEL, iter_chunks, open_writer, sheet_names
+
+# Número de ISBNs nuevos que se acumulan antes de escribirlos en la base de datos
+SAVE_EVERY = 25
+
+# Nombre de la columna que se añade con las fechas de lanzamiento
+DATE_COLUMN = 'Fecha de Lanzamiento'
+
+# Mensajes recientes que se guardan en memoria para mostrar el progreso
+LIVE_LOG_SIZE = 200
+
+# Log de un procesamiento: los últimos mensajes en un buffer circular de tamaño
+# fijo y, si se indica `sink` (un archivo o un StringIO), el log completo escrito
+# en él según llega, para que la memoria no crezca con el tamaño del archivo
+class MessageLog:
+    def __init__(self, sink=None, size=LIVE_LOG_SIZE):
+        self.recent = deque(maxlen=size)
+        self.sink = sink
+        self.count = 0
+
+    def append(self, message):
+        self.recent.append(message)
+        self.count += 1
+        if self.sink is not None:
+            self.sink.write(message + "\n")
+
+    # Últimos `lines` mensajes
+    def tail(self, lines=10):
+        return list(self.recent)[-lines:] if lines else []
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.recent)
+
+# Estadísticas vacías de un procesamiento
+def empty_stats():
+    return {"total": 0, "from_cache": 0, "from_api": 0, "not_found": 0, "known_missing": 0, "invalid": 0, "pending": 0}
+
+# Texto de estado con las estadísticas y los últimos mensajes
+def format_status(stats, messages, last_messages=10):
+    status_text = (
+        f"Total de ISBNs a procesar: {stats['total']}\n"
+        f"ISBNs encontrados en caché: {stats['from_cache']}\n"
+        f"ISBNs encontrados en API: {stats['from_api']}\n"
+        f"ISBNs no encontrados: {stats['not_found']}\n"
+        f"ISBNs conocidos sin fecha: {stats['known_missing']}\n"
+        f"ISBNs no válidos: {stats['invalid']}\n"
+        f"ISBNs pendientes: {stats['pending']}\n\n"
+    )
+    recent = messages.tail(last_messages) if isinstance(messages, MessageLog) else messages[-last_messages:]
+    return status_text + "\n".join(recent)
+
+# Resumir una columna de ISBNs: una fila por ISBN canónico con el ISBN limpio,
+# si es válido y en cuántas filas aparece
+def summarize_isbns(series):
+    with METRICS.timer("stage_seconds", stage=STAGE_NORMALIZE):
+        isbns = normalize_isbns(series.astype(str).str.strip())
+    return isbns.groupby('canonical', sort=False).agg(
+        clean=('clean', 'first'), valid=('valid', 'first'), rows=('clean', 'size'),
+    )
+
+# Combinar el resumen acumulado con el de un nuevo bloque de filas
+def merge_summaries(summary, other):
+    if summary is None:
+        return other
+    return pd.concat([summary, other]).groupby(level=0, sort=False).agg(
+        clean=('clean', 'first'), valid=('valid', 'first'), rows=('rows', 'sum'),
+    )
+
+# Resolver las fechas de los ISBNs distintos de un resumen: primero el índice,
+# luego la caché negativa y por último las APIs para los que falten. No depende
+# de Streamlit: el progreso se comunica con callbacks opcionales:
+#   - on_start(stats, keys_to_search): tras resolver el caché, antes de la API
+#   - on_progress(stats, processed, messages): tras cada resultado de la API
+#   - on_save(store): tras guardar ISBNs nuevos en la base de datos
+#   - on_result(key, result): con cada LookupResult de la API, antes de on_progress
+# `resolved` son los resultados {key: (fecha, encontrado)} de una ejecución
+# anterior interrumpida, que no se vuelven a buscar. Los mensajes se añaden a
+# `messages` (un MessageLog; si no se pasa, solo se guardan los últimos).
+# Devuelve (dates_by_key, stats, messages)
+def resolve_isbns(summary, store, max_in_flight=MAX_IN_FLIGHT, on_start=None, on_progress=None, on_save=None,
+                  on_result=None, resolved=None, messages=None):
+    unsaved_isbns = {}
+    unsaved_misses = {}
+
+    # Escribir en la base de datos los resultados pendientes de guardar
+    def flush():
+        with METRICS.timer("stage_seconds", stage=STAGE_PERSIST):
+            store.put_misses(unsaved_misses)
+            unsaved_misses.clear()
+            saved = bool(unsaved_isbns)
+            if saved:
+                store.put_many(unsaved_isbns)
+                unsaved_isbns.clear()
+        if saved and on_save:
+            on_save(store)
+
+    # Buscar en el índice cada ISBN distinto una sola vez. Si el ISBN-13 no está,
+    # se prueba también con el ISBN tal y como venía (entradas antiguas en ISBN-10)
+    cache_started = time.perf_counter()
+    dates_by_key = {}
+    for key, isbn_clean in zip(summary.index, summary['clean']):
+        date = store.get(key)
+        if date is None and isbn_clean != key:
+            date = store.get(isbn_clean)
+        if date is not None:
+            dates_by_key[key] = date
+
+    # Los ISBNs que ya fallaron hace poco (caché negativa) no se vuelven a buscar
+    known_missing = {}
+    valid_keys = summary.index[summary['valid'].astype(bool)]
+    for key in valid_keys:
+        if key not in dates_by_key:
+            kind = store.get_miss(key)
+            if kind is not None:
+                known_missing[key] = kind
+                dates_by_key[key] = "No encontrado"
+    METRICS.observe("stage_seconds", time.perf_counter() - cache_started, stage=STAGE_CACHE)
+
+    # Solo se buscan en la API los ISBNs válidos que no están en el índice ni se
+    # resolvieron en una ejecución anterior
+    rows_per_key = summary['rows']
+    in_cache = summary.index.isin(list(dates_by_key))
+    is_known_missing = summary.index.isin(list(known_missing))
+    invalid = ~in_cache & ~summary['valid'].astype(bool).to_numpy()
+    resumed = {
+        key: resolved[key] for key in valid_keys
+        if resolved and key in resolved and key not in dates_by_key
+    }
+    keys_to_search = [key for key in valid_keys if key not in dates_by_key and key not in resumed]
+
+    # Calcular estadísticas iniciales (en filas, no en ISBNs distintos)
+    total_isbns = int(rows_per_key.sum())
+    isbns_known_missing = int(rows_per_key[is_known_missing].sum())
+    isbns_in_cache = int(rows_per_key[in_cache].sum()) - isbns_known_missing
+    isbns_invalid = int(rows_per_key[invalid].sum())
+
+    stats = empty_stats()
+    stats.update({
+        "total": total_isbns,
+        "from_cache": isbns_in_cache,
+        "known_missing": isbns_known_missing,
+        "invalid": isbns_invalid,
+        "pending": total_isbns - isbns_in_cache - isbns_known_missing - isbns_invalid,
+    })
+
+    # Log para almacenar mensajes
+    if messages is None:
+        messages = MessageLog()
+
+    # Añadir mensaje neutral (sin formato de éxito) para ISBNs en caché
+    for key, date in dates_by_key.items():
+        if key in known_missing:
+            messages.append(f"ISBN {key} sin fecha conocida (no se vuelve a buscar todavía)")
+        else:
+            messages.append(f"ISBN {key} encontrado en caché: {date}")
+    for isbn_clean in summary.loc[invalid, 'clean']:
+        messages.append(f"ISBN {isbn_clean} no válido")
+
+    # Los resultados de la ejecución anterior cuentan como si acabaran de llegar de la API
+    for key, (date, found) in resumed.items():
+        rows = int(rows_per_key[key])
+        dates_by_key[key] = date
+        stats["from_api" if found else "not_found"] += rows
+        stats["pending"] -= rows
+        messages.append(f"ISBN {key} ya buscado en una ejecución anterior: {date}")
+
+    # Contar las veces que se pide cada ISBN, para refrescar antes los más pedidos
+    with METRICS.timer("stage_seconds", stage=STAGE_PERSIST):
+        store.record_requests(rows_per_key[valid_keys].items())
+
+    if on_start:
+        on_start(stats.copy(), keys_to_search)
+
+    processed = stats["total"] - stats["pending"]
+
+    # Buscar en la API de forma concurrente los ISBNs distintos que faltan
+    if keys_to_search:
+        messages.append(f"🔍 Buscando fechas para {len(keys_to_search)} ISBNs en API...")
+        # El motor reserva los ISBNs en la base de datos para no buscar a la vez
+        # los mismos que otra sesión u otro proceso
+        engine = LookupEngine(max_in_flight=max_in_flight, leases=store)
+        api_started = time.perf_counter()
+
+        # Mientras el motor espera ISBNs que busca otro proceso, se guarda lo
+        # pendiente por si ese proceso también espera alguno de los nuestros
+        for position, result in engine.lookup_many(keys_to_search, on_wait=flush):
+            key = keys_to_search[position]
+            date = result.date
+            rows = int(rows_per_key[key])
+            dates_by_key[key] = date
+
+            # Almacenar el resultado en el índice
+            if result.found:
+                unsaved_isbns[key] = date
+                stats["from_api"] += rows
+                messages.append(f"ISBN {key} resultado: {date}")
+            else:
+                stats["not_found"] += rows
+                if result.error is not None:
+                    messages.append(f"Error al buscar ISBN {key}: {result.error}")
+                messages.append(f"ISBN {key} no encontrado")
+
+                # Registrar el fallo en la caché negativa para no repetir la búsqueda
+                unsaved_misses[key] = MISS_ERROR if result.error is not None else MISS_NOT_FOUND
+
+            # Guardar cada SAVE_EVERY ISBNs añadidos para no perder progreso.
+            # Solo se escriben los ISBNs nuevos, no el índice entero
+            if len(unsaved_isbns) >= SAVE_EVERY or len(unsaved_misses) >= SAVE_EVERY:
+                flush()
+
+            stats["pending"] -= rows
+            processed += rows
+
+            if on_result:
+                on_result(key, result)
+            if on_progress:
+                on_progress(stats.copy(), processed, messages)
+
+        METRICS.observe("stage_seconds", time.perf_counter() - api_started, stage=STAGE_API)
+
+    # Guardar los fallos y los nuevos ISBNs que queden pendientes
+    flush()
+
+    METRICS.inc("rows_processed_total", stats["total"])
+    return dates_by_key, stats, messages
+
+# Celdas vacías de una columna (sin valor o solo con espacios)
+def _blank(values):
+    return values.isna().to_numpy() | (values.astype(str).str.strip() == '').to_numpy()
+
+# Valores no vacíos de las columnas de ISBNs de un bloque, en una sola serie
+def _isbn_values(df, columns):
+    values = pd.concat([df[column] for column in columns], ignore_index=True)
+    return values[~_blank(values)]
+
+# Nombre de la columna de fechas de una columna de ISBNs. Si el bloque tiene una
+# sola columna de ISBNs se mantiene el nombre de siempre
+def date_column_name(column, columns):
+    return DATE_COLUMN if len(columns) == 1 else f"{DATE_COLUMN} ({column})"
+
+# Añadir una columna de fechas por cada columna de ISBNs de un bloque de filas
+# (por defecto, la primera), repartiendo cada resultado a todas las filas con el
+# mismo ISBN. Los ISBNs sin fecha son los no válidos; las celdas vacías quedan vacías
+def apply_dates(df, dates_by_key, columns=None):
+    columns = [df.columns[0]] if columns is None else columns
+    for column in columns:
+        # Tratar la columna como texto para mantener el formato de los ISBNs
+        values = df[column]
+        blank = _blank(values)
+        df[column] = values.astype(str).where(~blank, values)
+
+        with METRICS.timer("stage_seconds", stage=STAGE_NORMALIZE):
+            canonical = normalize_isbns(df[column].astype(str).str.strip())['canonical']
+        dates = canonical.map(dates_by_key).fillna("ISBN no válido").to_numpy()
+        dates[blank] = ""
+        df[date_column_name(column, columns)] = dates
+    return df
+
+# Recorrer los bloques de un archivo midiendo el tiempo de lectura de cada uno
+def _timed_chunks(chunks):
+    chunks = iter(chunks)
+    while True:
+        with METRICS.timer("stage_seconds", stage=STAGE_PARSE):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+# Tamaño de la salida escrita, sea una ruta o un buffer en memoria
+def _written_size(target):
+    if isinstance(target, (str, os.PathLike)):
+        return os.path.getsize(target)
+    return 0 if target.closed else target.tell()
+
+# Resumir las columnas de ISBNs de todas las hojas de un archivo leyéndolo por
+# bloques. Las columnas de cada hoja se detectan en su primer bloque; las hojas
+# sin columnas de ISBNs se copian sin cambios, salvo que no se detecte ninguna en
+# todo el archivo, y entonces se usa la primera columna de cada hoja. `sheets`
+# limita las hojas que se procesan (por defecto, todas). Devuelve (summary, plan),
+# con plan = {hoja: [columnas de ISBNs]} para write_dates; las hojas sin filas no
+# aparecen. Todas las hojas comparten un solo resumen, así que cada ISBN se busca
+# una vez aunque aparezca en varias hojas o columnas
+def summarize_file(source, file_format, chunk_size=CHUNK_SIZE, sheets=None):
+    available = sheet_names(source, file_format)
+    if sheets:
+        unknown = [sheet for sheet in sheets if sheet not in available]
+        if unknown:
+            raise ValueError(f"El archivo no tiene las hojas: {', '.join(map(str, unknown))}")
+        available = [sheet for sheet in available if sheet in sheets]
+
+    summary = None
+    plan = {}
+    # Resumen y nombre de la primera columna de cada hoja, por si no se detecta ninguna
+    fallback = None
+    first_columns = {}
+    for sheet in available:
+        for chunk in _timed_chunks(iter_chunks(source, file_format, chunk_size, sheet=sheet)):
+            # Las hojas con cabecera y sin filas no se procesan
+            if chunk.empty:
+                break
+            if sheet not in plan:
+                plan[sheet] = detect_isbn_columns(chunk)
+                first_columns[sheet] = chunk.columns[0]
+            if plan[sheet]:
+                summary = merge_summaries(summary, summarize_isbns(_isbn_values(chunk, plan[sheet])))
+            elif summary is None:
+                fallback = merge_summaries(fallback, summarize_isbns(_isbn_values(chunk, chunk.columns[:1])))
+    if summary is None:
+        summary = fallback
+        plan = {sheet: [column] for sheet, column in first_columns.items()}
+    if summary is None:
+        raise ValueError("El archivo no contiene datos")
+    return summary, plan
+
+# Comprobar que el formato de salida admite todas las hojas del plan
+def check_output_format(plan, output_format):
+    if len(plan) > 1 and output_format != EXCEL:
+        raise ValueError("Para procesar varias hojas el archivo de salida debe ser Excel.")
+
+# Volver a leer el archivo por bloques y escribir cada bloque en la salida en
+# cuanto tiene sus fechas. `plan` es el de summarize_file; sin él se procesa la
+# primera columna de la primera hoja. Si la salida es Excel se copian también,
+# sin cambios y en su orden, las hojas del libro que no están en el plan (las no
+# seleccionadas, las que no tienen filas y las vacías).
+# Devuelve las primeras `preview_rows` filas escritas de las hojas procesadas
+def write_dates(source, target, dates_by_key, input_format, output_format=EXCEL, chunk_size=CHUNK_SIZE, preview_rows=0,
+                plan=None):
+    plan = {None: None} if plan is None else plan
+    check_output_format(plan, output_format)
+    sheets = list(plan)
+    if output_format == EXCEL and None not in plan:
+        sheets = sheet_names(source, input_format)
+    preview = []
+    preview_left = preview_rows
+    writer = open_writer(target, output_format)
+    try:
+        for sheet in sheets:
+            columns = plan.get(sheet, [])
+            written = False
+            for chunk in _timed_chunks(iter_chunks(source, input_format, chunk_size, sheet=sheet)):
+                apply_dates(chunk, dates_by_key, columns)
+                text_columns = [
+                    chunk.columns.get_loc(column) for column in (chunk.columns[:1] if columns is None else columns)
+                ]
+                with METRICS.timer("stage_seconds", stage=STAGE_EXPORT):
+                    writer.write(chunk, sheet=sheet, text_columns=text_columns)
+                written = True
+                if sheet in plan and preview_left > 0:
+                    preview.append(chunk.head(preview_left))
+                    preview_left -= len(preview[-1])
+            # Hoja sin ninguna celda: se crea vacía
+            if not written:
+                writer.write(pd.DataFrame(), sheet=sheet, text_columns=())
+    finally:
+        with METRICS.timer("stage_seconds", stage=STAGE_EXPORT):
+            writer.close()
+    METRICS.inc("bytes_written_total", _written_size(target), format=output_format)
+    return pd.concat(preview) if preview else pd.DataFrame()
+
+# Procesar un archivo grande en streaming. Primero se leen los ISBNs de todas
+# las hojas (o de las de `sheets`) para buscar cada ISBN distinto una vez; después
+# se escribe la salida por bloques, así que la memoria depende del tamaño de
+# bloque y no del archivo.
+# Devuelve (stats, messages, preview) con las primeras `preview_rows` filas procesadas
+def process_file(source, target, store, input_format, output_format=EXCEL, chunk_size=CHUNK_SIZE,
+                 max_in_flight=MAX_IN_FLIGHT, on_start=None, on_progress=None, on_save=None, preview_rows=0,
+                 messages=None, sheets=None):
+    summary, plan = summarize_file(source, input_format, chunk_size, sheets)
+    check_output_format(plan, output_format)
+    dates_by_key, stats, messages = resolve_isbns(
+        summary, store, max_in_flight=max_in_flight,
+        on_start=on_start, on_progress=on_progress, on_save=on_save, messages=messages,
+    )
+    preview = write_dates(source, target, dates_by_key, input_format, output_format, chunk_size, preview_rows, plan)
+    return stats, messages, preview
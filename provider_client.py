@@ -0,0 +1,128 @@
+import random
+import time
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+
+# Códigos HTTP que indican un problema temporal del proveedor y merecen reintento
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Error que se lanza sin hacer la petición mientras el circuito está abierto
+class CircuitOpenError(Exception):
+    pass
+
+# Cortacircuitos: tras varios fallos seguidos deja de llamar al proveedor durante
+# un tiempo de espera; después deja pasar una petición de prueba y, si funciona,
+# vuelve a cerrarse
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = Lock()
+
+    # Indicar si se puede hacer una petición ahora
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            # Pasado el tiempo de espera, solo una petición de prueba a la vez
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+# Cliente HTTP de un proveedor: sesión persistente con conexiones reutilizables,
+# timeouts explícitos, reintentos con espera exponencial aleatoria en 429/5xx
+# y cortacircuitos
+class ProviderClient:
+    def __init__(self, name, timeout=(5, 15), retries=2, backoff=0.5, max_backoff=8.0,
+                 breaker=None, pool_size=16):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # Tiempo de espera antes del siguiente intento
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * random.uniform(0.5, 1.5)
+
+    # Hacer una petición GET y devolver el JSON de la respuesta
+    def get_json(self, url, params=None):
+        if not self.breaker.allow():
+            METRICS.inc("provider_circuit_open_total", provider=self.name)
+            raise CircuitOpenError(f"{self.name}: demasiados fallos seguidos, se usa el siguiente proveedor")
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                METRICS.inc("provider_retries_total", provider=self.name)
+            response = None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                # Cualquier error de red o de transporte (conexión, timeout, respuesta
+                # cortada...) cuenta como fallo del proveedor. Si no se contara, una
+                # petición de prueba fallida dejaría el circuito abierto para siempre
+                last_error = e
+                if isinstance(e, requests.Timeout):
+                    METRICS.inc("provider_timeouts_total", provider=self.name)
+                METRICS.inc("provider_requests_total", provider=self.name, status="error")
+            else:
+                METRICS.inc("provider_requests_total", provider=self.name, status=str(response.status_code))
+                METRICS.inc("provider_bytes_received_total", len(response.content), provider=self.name)
+            finally:
+                METRICS.observe("provider_request_seconds", time.perf_counter() - started, provider=self.name)
+
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES:
+                    try:
+                        response.raise_for_status()
+                        data = response.json()
+                    except Exception:
+                        # Un error que no es del servicio (400, respuesta inválida...)
+                        # no debe abrir el circuito
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_success()
+                    return data
+                last_error = requests.HTTPError(
+                    f"{self.name}: HTTP {response.status_code}", response=response
+                )
+
+            if attempt < self.retries:
+                time.sleep(self._retry_delay(attempt, response))
+
+        self.breaker.record_failure()
+        METRICS.inc("provider_failures_total", provider=self.name)
+        raise last_error
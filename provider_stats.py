@@ -0,0 +1,118 @@
+import random
+from collections import defaultdict
+from threading import Lock
+
+# Dígitos del ISBN-13 que forman el grupo de registro (97884 = España)
+PREFIX_LENGTH = 5
+
+# Búsquedas mínimas en un grupo antes de fiarse de sus estadísticas
+MIN_SAMPLES = 20
+
+# Peso de cada nueva medida en la media móvil de latencia
+LATENCY_ALPHA = 0.2
+
+# Parte de los ISBNs que se buscan empezando por otro proveedor, para seguir
+# midiendo la tasa de aciertos de los que no van primeros
+EXPLORE_RATIO = 0.05
+
+# Grupo de registro/editorial de un ISBN-13, usado para agrupar estadísticas
+def isbn_prefix(isbn, length=PREFIX_LENGTH):
+    return isbn[:length]
+
+# Estadísticas de cada proveedor (aciertos y latencia por ISBN), globales y por
+# grupo de ISBN, para decidir a qué proveedor preguntar primero
+class ProviderStats:
+    def __init__(self, prefix_length=PREFIX_LENGTH, min_samples=MIN_SAMPLES, explore_ratio=EXPLORE_RATIO, seed=None):
+        self.prefix_length = prefix_length
+        self.min_samples = min_samples
+        self.explore_ratio = explore_ratio
+        self.random = random.Random(seed)
+        self.lock = Lock()
+        # (proveedor, prefijo) -> [búsquedas, aciertos]; el prefijo None es el total
+        self.counts = defaultdict(lambda: [0, 0])
+        # (proveedor, prefijo) -> media móvil de la latencia por ISBN
+        self.latency = {}
+
+    # Registrar una petición a un proveedor con los ISBNs consultados y los encontrados.
+    # La latencia de la petición se reparte entre los ISBNs del lote. Los aciertos
+    # solo se cuentan para los ISBNs de `first` (por defecto, todos), a los que este
+    # proveedor se pidió en primer lugar: los que le llegan tras el fallo de otro
+    # son más difíciles y bajarían su tasa. Una petición fallida cuenta como
+    # búsqueda sin aciertos
+    def record(self, provider, isbns, found, latency, first=None):
+        if not isbns:
+            return
+        first = set(isbns) if first is None else set(first)
+        per_isbn = latency / len(isbns)
+        with self.lock:
+            prefixes = {None}
+            for isbn in isbns:
+                prefix = isbn_prefix(isbn, self.prefix_length)
+                prefixes.add(prefix)
+                if isbn not in first:
+                    continue
+                hit = 1 if isbn in found else 0
+                for key in (prefix, None):
+                    counts = self.counts[(provider, key)]
+                    counts[0] += 1
+                    counts[1] += hit
+            for prefix in prefixes:
+                previous = self.latency.get((provider, prefix))
+                self.latency[(provider, prefix)] = (
+                    per_isbn if previous is None else previous + LATENCY_ALPHA * (per_isbn - previous)
+                )
+
+    # Tasa de aciertos estimada (con suavizado para grupos con pocos datos)
+    def hit_rate(self, provider, prefix=None):
+        with self.lock:
+            lookups, hits = self.counts.get((provider, prefix), (0, 0))
+        return (hits + 1) / (lookups + 2)
+
+    def _lookups(self, provider, prefix):
+        with self.lock:
+            return self.counts.get((provider, prefix), (0, 0))[0]
+
+    # Ordenar los proveedores para un ISBN. Preguntar primero a A compensa si
+    # latencia_A / aciertos_A < latencia_B / aciertos_B, así que se ordena por ese
+    # coste. Sin datos suficientes se mantiene el orden por defecto
+    def provider_order(self, isbn, providers):
+        prefix = isbn_prefix(isbn, self.prefix_length)
+        if all(self._lookups(p, prefix) >= self.min_samples for p in providers):
+            bucket = prefix
+        elif all(self._lookups(p, None) >= self.min_samples for p in providers):
+            bucket = None
+        else:
+            return tuple(providers)
+
+        def cost(provider):
+            with self.lock:
+                latency = self.latency.get((provider, bucket), self.latency.get((provider, None), 0.0))
+            return latency / self.hit_rate(provider, bucket)
+
+        return tuple(sorted(providers, key=cost))
+
+    # Orden para un ISBN concreto: casi siempre `order`, pero una parte
+    # `explore_ratio` de las veces empieza por otro proveedor, para que todos
+    # sigan teniendo búsquedas en primer lugar con las que medir sus aciertos
+    def explore(self, order):
+        order = tuple(order)
+        if len(order) < 2 or self.random.random() >= self.explore_ratio:
+            return order
+        first = self.random.choice(order[1:])
+        return (first, *(provider for provider in order if provider != first))
+
+    # Resumen por proveedor para mostrar en la interfaz
+    def summary(self):
+        with self.lock:
+            return {
+                provider: {
+                    "lookups": self.counts[(provider, None)][0],
+                    "hits": self.counts[(provider, None)][1],
+                    "latency": latency,
+                }
+                for (provider, prefix), latency in self.latency.items()
+                if prefix is None
+            }
+
+# Estadísticas compartidas por todas las búsquedas del proceso
+PROVIDER_STATS = ProviderStats()
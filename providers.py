@@ -0,0 +1,154 @@
+import time
+from collections import namedtuple
+from isbnlib import is_isbn10, to_isbn13
+
+from provider_client import ProviderClient
+from provider_stats import PROVIDER_STATS
+
+# Nombres de los proveedores, en el orden por defecto en que se consultan
+GOOGLE_BOOKS = "google_books"
+OPEN_LIBRARY = "open_library"
+PROVIDERS = (GOOGLE_BOOKS, OPEN_LIBRARY)
+
+GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1/volumes"
+OPEN_LIBRARY_URL = "https://openlibrary.org/api/books"
+
+# Un cliente con conexiones persistentes por proveedor, compartido por todos los hilos.
+# Timeouts de (conexión, lectura) en segundos
+CLIENTS = {
+    GOOGLE_BOOKS: ProviderClient(GOOGLE_BOOKS, timeout=(5, 15)),
+    OPEN_LIBRARY: ProviderClient(OPEN_LIBRARY, timeout=(5, 20)),
+}
+
+# Resultado de una búsqueda: la fecha, si se encontró y el último error (si lo hubo)
+LookupResult = namedtuple("LookupResult", ["isbn", "date", "found", "error"])
+
+# Formatear la fecha de Google Books como YYYY o DD-MM-YY según la longitud
+def format_google_date(published_date):
+    if len(published_date) == 4:  # Solo año
+        return published_date
+    elif len(published_date) >= 10:  # Fecha completa
+        date_parts = published_date.split('-')
+        if len(date_parts) >= 3:
+            return f"{date_parts[2][:2]}-{date_parts[1]}-{date_parts[0][2:]}"
+    return published_date
+
+# Buscar un ISBN en Google Books. Devuelve la fecha o None si no hay resultados
+def fetch_from_google_books(isbn):
+    data = CLIENTS[GOOGLE_BOOKS].get_json(GOOGLE_BOOKS_URL, params={"q": f"isbn:{isbn}"})
+
+    if data.get('totalItems', 0) > 0:
+        return format_google_date(data['items'][0]['volumeInfo'].get('publishedDate', 'Desconocido'))
+    return None
+
+# Buscar un ISBN en Open Library. Devuelve la fecha o None si no hay resultados
+def fetch_from_open_library(isbn):
+    data = CLIENTS[OPEN_LIBRARY].get_json(
+        OPEN_LIBRARY_URL, params={"bibkeys": f"ISBN:{isbn}", "format": "json", "jscmd": "data"}
+    )
+
+    if f"ISBN:{isbn}" in data:
+        return data[f"ISBN:{isbn}"].get("publish_date", "Desconocido")
+    return None
+
+FETCHERS = {
+    GOOGLE_BOOKS: fetch_from_google_books,
+    OPEN_LIBRARY: fetch_from_open_library,
+}
+
+# Número máximo de ISBNs por petición en las búsquedas por lotes
+BATCH_SIZES = {
+    GOOGLE_BOOKS: 20,
+    OPEN_LIBRARY: 50,
+}
+
+# Obtener los ISBN-13 de un volumen de Google Books a partir de sus identificadores
+def _google_volume_isbns(volume_info):
+    isbns = set()
+    for identifier in volume_info.get('industryIdentifiers', []):
+        value = identifier.get('identifier', '')
+        if identifier.get('type') == 'ISBN_13':
+            isbns.add(value)
+        elif identifier.get('type') == 'ISBN_10' and is_isbn10(value):
+            isbns.add(to_isbn13(value))
+    return isbns
+
+# Buscar varios ISBN-13 en una sola petición a Google Books.
+# Devuelve un diccionario {isbn: fecha} solo con los encontrados
+def fetch_batch_from_google_books(isbns):
+    wanted = set(isbns)
+    query = " OR ".join(f"isbn:{isbn}" for isbn in isbns)
+    data = CLIENTS[GOOGLE_BOOKS].get_json(GOOGLE_BOOKS_URL, params={"q": query, "maxResults": 40})
+
+    dates = {}
+    for item in data.get('items', []):
+        volume_info = item.get('volumeInfo', {})
+        for isbn in _google_volume_isbns(volume_info) & wanted:
+            # Si hay varios volúmenes para el mismo ISBN, nos quedamos con el primero
+            if isbn not in dates:
+                dates[isbn] = format_google_date(volume_info.get('publishedDate', 'Desconocido'))
+    return dates
+
+# Buscar varios ISBN-13 en una sola petición a Open Library.
+# Devuelve un diccionario {isbn: fecha} solo con los encontrados
+def fetch_batch_from_open_library(isbns):
+    data = CLIENTS[OPEN_LIBRARY].get_json(
+        OPEN_LIBRARY_URL,
+        params={"bibkeys": ",".join(f"ISBN:{isbn}" for isbn in isbns), "format": "json", "jscmd": "data"},
+    )
+
+    dates = {}
+    for isbn in isbns:
+        if f"ISBN:{isbn}" in data:
+            dates[isbn] = data[f"ISBN:{isbn}"].get("publish_date", "Desconocido")
+    return dates
+
+BATCH_FETCHERS = {
+    GOOGLE_BOOKS: fetch_batch_from_google_books,
+    OPEN_LIBRARY: fetch_batch_from_open_library,
+}
+
+# Convertir un ISBN-10 a ISBN-13; el resto se devuelve tal cual
+def canonical_isbn(isbn):
+    if is_isbn10(isbn):
+        return to_isbn13(isbn)
+    return isbn
+
+# Consultar un ISBN en un proveedor, registrando latencia y acierto (este solo
+# cuenta si es el primer proveedor al que se pregunta, `first`)
+def _fetch_one(provider, isbn, rate_limiters, stats, first):
+    if rate_limiters and provider in rate_limiters:
+        rate_limiters[provider].acquire()
+    started = time.monotonic()
+    try:
+        date = FETCHERS[provider](isbn)
+    except Exception:
+        stats.record(provider, [isbn], (), time.monotonic() - started, [isbn] if first else ())
+        raise
+    stats.record(provider, [isbn], () if date is None else (isbn,), time.monotonic() - started, [isbn] if first else ())
+    return date
+
+# Buscar un ISBN en los proveedores, empezando por el que mejor funciona para su
+# grupo de ISBN. Si se pasan limitadores, se espera a tener un token del
+# proveedor antes de cada petición
+def lookup_isbn(isbn, rate_limiters=None, stats=None):
+    # Convertir cualquier ISBN-10 a ISBN-13 para consistencia
+    isbn = canonical_isbn(isbn)
+    stats = PROVIDER_STATS if stats is None else stats
+
+    error = None
+    for attempt, provider in enumerate(stats.explore(stats.provider_order(isbn, PROVIDERS))):
+        try:
+            date = _fetch_one(provider, isbn, rate_limiters, stats, attempt == 0)
+            if date is not None:
+                return LookupResult(isbn, date, True, None)
+        except Exception as e:
+            # Si falla un proveedor, guardamos el error y continuamos con el siguiente
+            error = e
+
+    return LookupResult(isbn, "No encontrado", False, error)  # Si no se encuentra en ninguna API
+
+# Función para buscar ISBN en API
+def fetch_isbn_date_from_api(isbn):
+    result = lookup_isbn(isbn)
+    return result.date, result.found
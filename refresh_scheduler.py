@@ -0,0 +1,182 @@
+import argparse
+import sys
+import time
+from threading import Event, Thread
+
+from isbn_store import MISS_ERROR, MISS_NOT_FOUND, ORIGIN_API, ORIGIN_LEGACY, add_store_args, open_store
+from lookup_engine import LookupEngine
+from metrics import METRICS
+from providers import GOOGLE_BOOKS, OPEN_LIBRARY
+from release_dates import parse_release_date
+
+# Días tras los que se vuelve a buscar una fecha completa y una fecha sin día
+# (solo año o año y mes, o texto sin interpretar)
+REFRESH_AFTER_DAYS = 180
+LOW_PRECISION_REFRESH_AFTER_DAYS = 30
+
+# ISBNs por tanda y segundos entre tandas
+REFRESH_BATCH_SIZE = 20
+REFRESH_INTERVAL = 30.0
+
+# Límites de peticiones del refresco, por debajo de los de los procesamientos
+# para dejarles casi toda la cuota de los proveedores
+REFRESH_RATE_LIMITS = {
+    GOOGLE_BOOKS: (1.0, 1),
+    OPEN_LIBRARY: (0.5, 1),
+}
+
+# Decidir si la nueva fecha de un ISBN sustituye a la guardada. Se comparan
+# las fechas interpretadas, no el texto ("01-04-25" y "1 de abril de 2025" son
+# la misma): solo se sustituye si la nueva es más precisa o, con la misma
+# precisión, es otra fecha
+def _improves(date, previous):
+    parsed = parse_release_date(date)
+    if parsed is None:
+        return False
+    previous = parse_release_date(previous)
+    if previous is None or parsed[3] > previous[3]:
+        return True
+    return parsed[3] == previous[3] and parsed[:3] != previous[:3]
+
+def _choose_refreshed(entries, existing):
+    return {
+        isbn: date for isbn, date in entries.items()
+        if isbn not in existing or _improves(date, existing[isbn])
+    }
+
+# Las fechas antiguas pueden estar escritas a mano, así que solo se completan:
+# la nueva se guarda si es más precisa, nunca si solo es distinta
+def _more_precise(date, previous):
+    parsed = parse_release_date(date)
+    previous = parse_release_date(previous)
+    return parsed is not None and (previous is None or parsed[3] > previous[3])
+
+def _choose_upgrades(entries, existing):
+    return {
+        isbn: date for isbn, date in entries.items()
+        if isbn not in existing or _more_precise(date, existing[isbn])
+    }
+
+# Refresco en segundo plano del índice: vuelve a buscar en las APIs las fechas
+# antiguas, las incompletas y los ISBNs no encontrados cuya caché negativa ha
+# caducado, los más pedidos primero. Las fechas antiguas (de antes de guardar
+# el origen) solo se completan con fechas más precisas, y las escritas a mano o
+# importadas no se tocan nunca. Trabaja en tandas pequeñas con límites de
+# peticiones propios y solo cuando `is_idle()` dice que no hay procesamientos
+# en curso, así que no añade esperas a los archivos que suben los usuarios
+class RefreshScheduler:
+    def __init__(self, store, is_idle=None, batch_size=REFRESH_BATCH_SIZE, interval=REFRESH_INTERVAL,
+                 rate_limits=None, refresh_after_days=REFRESH_AFTER_DAYS,
+                 low_precision_refresh_after_days=LOW_PRECISION_REFRESH_AFTER_DAYS):
+        self.store = store
+        self.is_idle = is_idle
+        self.batch_size = batch_size
+        self.interval = interval
+        self.refresh_after = refresh_after_days * 24 * 3600
+        self.low_precision_refresh_after = low_precision_refresh_after_days * 24 * 3600
+        # Sin reservas en la base de datos: reservar no deja buscar ISBNs que ya tienen resultado
+        self.engine = LookupEngine(
+            max_in_flight=2, rate_limits=REFRESH_RATE_LIMITS if rate_limits is None else rate_limits,
+        )
+        self.stopped = Event()
+        self.thread = None
+        self.last_error = None
+
+    # Refrescar una tanda. Devuelve cuántos ISBNs se comprobaron, cuántos
+    # cambiaron de fecha, cuántos no encontrados antes tienen ahora fecha y
+    # cuántos siguen sin encontrarse
+    def run_once(self, now=None):
+        now = time.time() if now is None else now
+        self.store.refresh()
+        isbns = self.store.refresh_candidates(
+            self.batch_size, now - self.refresh_after, now - self.low_precision_refresh_after, now,
+        )
+        counts = {"checked": len(isbns), "updated": 0, "added": 0, "not_found": 0}
+        if not isbns:
+            return counts
+
+        found = {}
+        misses = {}
+        for position, result in self.engine.lookup_many(isbns):
+            isbn = isbns[position]
+            if result.found:
+                found[isbn] = result.date
+            else:
+                misses[isbn] = MISS_ERROR if result.error is not None else MISS_NOT_FOUND
+
+        written, existing = self.store.merge_many(found, _choose_refreshed, replaceable=(ORIGIN_API,))
+        upgraded, legacy = self.store.merge_many(
+            {isbn: date for isbn, date in found.items() if isbn not in written}, _choose_upgrades,
+            replaceable=(ORIGIN_LEGACY,),
+        )
+        written.update(upgraded)
+        existing.update(legacy)
+        # Los que ya tenían fecha y no han mejorado se dan por comprobados ahora
+        self.store.touch_many(isbn for isbn in isbns if isbn in self.store and isbn not in written)
+        self.store.put_misses({isbn: kind for isbn, kind in misses.items() if isbn not in self.store})
+
+        counts["updated"] = sum(1 for isbn in written if isbn in existing)
+        counts["added"] = len(written) - counts["updated"]
+        counts["not_found"] = len(misses)
+        for name, value in counts.items():
+            METRICS.inc(f"refresh_{name}_total", value)
+        return counts
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(target=self._run, name="index-refresh", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if self.is_idle is not None and not self.is_idle():
+                continue
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                # Un fallo en una tanda no debe parar el refresco; se reintenta en la siguiente
+                self.last_error = str(e)
+                METRICS.inc("refresh_errors_total")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Vuelve a buscar las fechas antiguas, incompletas o no encontradas del índice de ISBNs.",
+    )
+    add_store_args(parser)
+    parser.add_argument(
+        "--batches", type=int, default=1,
+        help="Tandas a refrescar antes de terminar; 0 para seguir hasta que no quede nada (por defecto 1)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=REFRESH_BATCH_SIZE,
+        help=f"ISBNs por tanda (por defecto {REFRESH_BATCH_SIZE})",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = open_store(args)
+    scheduler = RefreshScheduler(store, batch_size=args.batch_size)
+    batches = 0
+    try:
+        while args.batches == 0 or batches < args.batches:
+            counts = scheduler.run_once()
+            if not counts["checked"]:
+                break
+            batches += 1
+            print(
+                f"{counts['checked']} ISBNs comprobados: {counts['updated']} con fecha nueva, "
+                f"{counts['added']} encontrados por primera vez, {counts['not_found']} sin encontrar",
+                file=sys.stderr,
+            )
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import calendar
+import re
+import time
+
+# Precisión de una fecha de lanzamiento. RAW es una fecha que no se ha podido
+# interpretar y se guarda tal cual
+RAW = 0
+YEAR = 1
+MONTH = 2
+DAY = 3
+
+# Años aceptados como fecha de publicación; fuera de este rango se guarda el texto
+MIN_YEAR = 1000
+MAX_YEAR = 2999
+
+MONTHS = {
+    # Español
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12,
+    # Inglés (Open Library)
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9,
+    'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+_ISO = re.compile(r'(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?')
+# Formato corto que genera format_google_date (DD-MM-AA)
+_SHORT = re.compile(r'(\d{1,2})-(\d{1,2})-(\d{2})')
+# "1 de abril de 2025", "abril de 2025", "15 March 2010", "March 2010"
+_DAY_MONTH_YEAR = re.compile(r'(?:(\d{1,2})\s+(?:de\s+)?)?([a-z]+)\.?\s+(?:de\s+)?(\d{4})')
+# "Nov 01, 2014", "March 15, 2010"
+_MONTH_DAY_YEAR = re.compile(r'([a-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})')
+
+def _two_digit_year(year):
+    current = time.gmtime().tm_year
+    year += 2000
+    return year if year <= current else year - 100
+
+def _typed(year, month=None, day=None):
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        return None
+    if month is None:
+        return year, 0, 0, YEAR
+    if not 1 <= month <= 12:
+        return None
+    if day is None:
+        return year, month, 0, MONTH
+    if not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    return year, month, day, DAY
+
+# Interpretar una fecha de lanzamiento en cualquiera de los formatos que
+# devuelven los proveedores. Devuelve (año, mes, día, precisión), con 0 en las
+# partes desconocidas, o None si no se reconoce
+def parse_release_date(text):
+    text = str(text).strip().lower()
+
+    match = _ISO.fullmatch(text)
+    if match:
+        year, month, day = (int(part) if part else None for part in match.groups())
+        return _typed(year, month, day)
+
+    match = _SHORT.fullmatch(text)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+        return _typed(_two_digit_year(year), month, day)
+
+    match = _DAY_MONTH_YEAR.fullmatch(text)
+    if match and match.group(2) in MONTHS:
+        day = int(match.group(1)) if match.group(1) else None
+        return _typed(int(match.group(3)), MONTHS[match.group(2)], day)
+
+    match = _MONTH_DAY_YEAR.fullmatch(text)
+    if match and match.group(1) in MONTHS:
+        return _typed(int(match.group(3)), MONTHS[match.group(1)], int(match.group(2)))
+
+    return None
+
+# Texto normalizado de una fecha ya interpretada: AAAA-MM-DD, AAAA-MM o AAAA
+def format_release_date(year, month, day, precision):
+    if precision == DAY:
+        return f"{year:04d}-{month:02d}-{day:02d}"
+    if precision == MONTH:
+        return f"{year:04d}-{month:02d}"
+    return f"{year:04d}"
+
+# Precisión de una fecha en texto (RAW si no se reconoce)
+def date_precision(text):
+    parsed = parse_release_date(text)
+    return RAW if parsed is None else parsed[3]
@@ -0,0 +1,88 @@
+import re
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import islice
+
+from isbnlib import is_isbn10, to_isbn13
+
+# Resultados por página en las búsquedas
+PAGE_SIZE = 50
+
+# Separar una fecha en palabras para buscarlas ("1 de abril de 2025" -> 1, de, abril, de, 2025)
+def date_tokens(date):
+    return re.findall(r'\w+', str(date).lower())
+
+# Índice de búsqueda sobre el índice de ISBNs. Las claves se guardan ordenadas
+# para resolver búsquedas por prefijo con bisección, y las fechas en un índice
+# invertido de palabras. Como muchos libros comparten fecha, el índice invertido
+# va de palabra a fechas distintas y de cada fecha a sus posiciones.
+# Se construye una vez por versión del índice
+class SearchIndex:
+    def __init__(self, items):
+        items = sorted(items)
+        self.keys = [isbn for isbn, _ in items]
+        self.dates = [date for _, date in items]
+
+        # Fecha -> posiciones (ordenadas) de los ISBNs con esa fecha
+        self.date_positions = {}
+        for position, date in enumerate(self.dates):
+            self.date_positions.setdefault(date, []).append(position)
+
+        # Palabra -> fechas distintas que la contienen
+        self.token_dates = {}
+        for date in self.date_positions:
+            for token in set(date_tokens(date)):
+                self.token_dates.setdefault(token, set()).add(date)
+        self.tokens = sorted(self.token_dates)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Posiciones de los ISBNs cuyo número empieza por el término. Un término sin
+    # dígitos no coincide con ninguno
+    def _prefix_range(self, term):
+        term = re.sub(r'[^0-9Xx]', '', term).upper()
+        if not term:
+            return 0, 0
+        # Un ISBN-10 completo se busca por su ISBN-13, que es como se guarda
+        if is_isbn10(term):
+            term = to_isbn13(term)
+        left = bisect_left(self.keys, term)
+        right = bisect_right(self.keys, term + '\uffff')
+        return left, right
+
+    # Buscar ISBNs por prefijo. Devuelve (total, resultados de la página)
+    def search_prefix(self, term, offset=0, limit=PAGE_SIZE):
+        left, right = self._prefix_range(term)
+        start = min(left + offset, right)
+        end = min(start + limit, right)
+        return right - left, list(zip(self.keys[start:end], self.dates[start:end]))
+
+    # Buscar por fecha: todas las palabras del término deben aparecer en la fecha;
+    # la última puede estar a medio escribir (búsqueda por prefijo).
+    # Devuelve (total, resultados de la página)
+    def search_date(self, term, offset=0, limit=PAGE_SIZE):
+        words = date_tokens(term)
+        if not words:
+            return 0, []
+
+        matches = None
+        for i, word in enumerate(words):
+            if i == len(words) - 1:
+                # Unir las fechas de todas las palabras que empiezan por el término
+                left = bisect_left(self.tokens, word)
+                right = bisect_right(self.tokens, word + '\uffff')
+                dates = set()
+                for token in self.tokens[left:right]:
+                    dates.update(self.token_dates[token])
+            else:
+                dates = self.token_dates.get(word, set())
+            matches = dates if matches is None else matches & dates
+            if not matches:
+                return 0, []
+
+        # Mezclar las posiciones ya ordenadas de cada fecha y cortar solo la página pedida
+        position_lists = [self.date_positions[date] for date in matches]
+        total = sum(len(positions) for positions in position_lists)
+        page = islice(merge(*position_lists), offset, offset + limit)
+        return total, [(self.keys[p], self.dates[p]) for p in page]
@@ -0,0 +1,212 @@
+import csv
+import io
+import os
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+# Número de filas por bloque al leer y escribir archivos grandes
+CHUNK_SIZE = 10000
+
+# Formatos admitidos (por extensión)
+EXCEL = "xlsx"
+EXCEL_LEGACY = "xls"
+CSV = "csv"
+PARQUET = "parquet"
+FORMATS = (EXCEL, EXCEL_LEGACY, CSV, PARQUET)
+
+MIME_TYPES = {
+    EXCEL: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    CSV: "text/csv",
+    PARQUET: "application/octet-stream",
+}
+
+# Deducir el formato a partir del nombre del archivo
+def detect_format(name):
+    extension = os.path.splitext(str(name))[1].lower().lstrip('.')
+    if extension not in FORMATS:
+        raise ValueError(f"Formato de archivo no admitido: .{extension}")
+    return extension
+
+# pyarrow solo hace falta para Parquet, así que se importa al usarlo
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Para leer o escribir archivos Parquet hay que instalar pyarrow.")
+    return pyarrow
+
+# Volver al principio de un archivo en memoria para poder leerlo otra vez
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+# Nombres de columna como los pone pandas: "Unnamed: i" si la cabecera está
+# vacía y, si se repite un nombre, "ISBN", "ISBN.1", "ISBN.2"...
+def _column_names(header):
+    names = [
+        str(name) if name is not None else f"Unnamed: {i}"
+        for i, name in enumerate(header)
+    ]
+    counts = {}
+    for i, name in enumerate(names):
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+# Nombres de las hojas de un archivo. Los formatos sin hojas tienen una sola, None
+def sheet_names(source, file_format):
+    _rewind(source)
+    if file_format == EXCEL:
+        workbook = load_workbook(source, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    if file_format == EXCEL_LEGACY:
+        return list(pd.ExcelFile(source).sheet_names)
+    return [None]
+
+def _iter_excel_chunks(source, chunk_size, sheet):
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _column_names(header)
+        # Sin deducir tipos por bloque: una columna numérica de ISBNs con alguna celda
+        # vacía pasaría a float y "9780306406157" se leería como "9780306406157.0"
+        chunk = []
+        empty = True
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns, dtype=object)
+                chunk = []
+                empty = False
+        # Una hoja con cabecera y sin filas da un bloque vacío, como pd.read_csv
+        if chunk or empty:
+            yield pd.DataFrame(chunk, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+def _iter_parquet_chunks(source, chunk_size):
+    parquet_file = _pyarrow().parquet.ParquetFile(source)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+# Leer un archivo por bloques de `chunk_size` filas sin cargarlo entero en memoria.
+# En Excel se lee la hoja `sheet` (por defecto, la primera). Un archivo u hoja
+# con cabecera y sin filas da un único bloque vacío con sus columnas
+def iter_chunks(source, file_format, chunk_size=CHUNK_SIZE, sheet=None):
+    _rewind(source)
+    if file_format == EXCEL:
+        yield from _iter_excel_chunks(source, chunk_size, sheet)
+    elif file_format == CSV:
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    elif file_format == PARQUET:
+        yield from _iter_parquet_chunks(source, chunk_size)
+    elif file_format == EXCEL_LEGACY:
+        # El formato .xls antiguo no se puede leer en streaming
+        df = pd.read_excel(source, sheet_name=sheet if sheet is not None else 0, dtype=object)
+        if df.empty:
+            yield df
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        raise ValueError(f"Formato de archivo no admitido: {file_format}")
+
+# Leer solo las primeras filas de un archivo
+def read_head(source, file_format, rows=5, sheet=None):
+    chunk = next(iter_chunks(source, file_format, chunk_size=rows, sheet=sheet), None)
+    return chunk if chunk is not None else pd.DataFrame()
+
+# Escritor de Excel en modo write-only: las filas se vuelcan según llegan y el
+# formato de texto de las columnas de ISBNs se define una vez para toda la columna.
+# Cada hoja se crea la primera vez que se escribe en ella. Los escritores de CSV
+# y Parquet tienen la misma interfaz pero escriben una sola tabla, así que
+# ignoran `sheet` y `text_columns`
+class ExcelChunkWriter:
+    def __init__(self, target, sheet_name='ISBNs'):
+        self.target = target
+        self.sheet_name = sheet_name
+        self.workbook = Workbook(write_only=True)
+        self.worksheets = {}
+
+    # `text_columns` son las posiciones de las columnas de ISBNs
+    def write(self, chunk, sheet=None, text_columns=(0,)):
+        sheet = self.sheet_name if sheet is None else sheet
+        worksheet = self.worksheets.get(sheet)
+        if worksheet is None:
+            worksheet = self.worksheets[sheet] = self.workbook.create_sheet(sheet)
+            # Formato de texto para las columnas de ISBNs (debe fijarse antes de la primera fila)
+            for position in text_columns:
+                worksheet.column_dimensions[get_column_letter(position + 1)].number_format = '@'
+            worksheet.append([str(column) for column in chunk.columns])
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            worksheet.append(row)
+
+    def close(self):
+        if not self.worksheets:
+            self.workbook.create_sheet(self.sheet_name).append([])
+        self.workbook.save(self.target)
+
+class CSVChunkWriter:
+    def __init__(self, target):
+        self.target = target
+        self.header_written = False
+        if isinstance(target, (str, os.PathLike)):
+            self.handle = open(target, 'w', encoding='utf-8', newline='')
+        elif isinstance(target, io.TextIOBase):
+            self.handle = target
+        else:
+            # Buffer binario (por ejemplo un BytesIO para descargar)
+            self.handle = io.TextIOWrapper(target, encoding='utf-8', newline='', write_through=True)
+
+    def write(self, chunk, sheet=None, text_columns=None):
+        chunk.to_csv(self.handle, index=False, header=not self.header_written, quoting=csv.QUOTE_MINIMAL)
+        self.header_written = True
+
+    def close(self):
+        self.handle.flush()
+        if isinstance(self.target, (str, os.PathLike)):
+            self.handle.close()
+        elif isinstance(self.handle, io.TextIOWrapper) and self.handle is not self.target:
+            # Soltar el buffer sin cerrarlo para que siga siendo legible
+            self.handle.detach()
+
+class ParquetChunkWriter:
+    def __init__(self, target):
+        self.target = target
+        self.writer = None
+
+    def write(self, chunk, sheet=None, text_columns=None):
+        pyarrow = _pyarrow()
+        # Todas las columnas como texto para que el esquema sea igual en todos los bloques
+        table = pyarrow.Table.from_pandas(chunk.astype(str).where(chunk.notna(), None), preserve_index=False)
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.target, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+# Crear el escritor por bloques adecuado para el formato de salida
+def open_writer(target, file_format):
+    if file_format == EXCEL:
+        return ExcelChunkWriter(target)
+    if file_format == CSV:
+        return CSVChunkWriter(target)
+    if file_format == PARQUET:
+        return ParquetChunkWriter(target)
+    raise ValueError(f"Formato de salida no admitido: {file_format}")
@@ -0,0 +1,16 @@
+from compact_index import CompactIndex, write_compact_index
+
+def test_dates_are_returned_as_written(tmp_path):
+    path = tmp_path / "index.compact"
+    entries = {
+        "9780306406157": "2017-09-02",
+        "9788401034787": "02-09-17",
+        "9788401034788": "2 de septiembre de 2017",
+        "9788401034789": "2017-09",
+        "9791090636071": "sin fecha",
+    }
+    write_compact_index(path, entries.items())
+    index = CompactIndex.load(path)
+    assert dict(index.items()) == entries
+    assert index.get("9788401034787") == "02-09-17"
+    assert index.raw == ["02-09-17", "2 de septiembre de 2017", "sin fecha"]
@@ -0,0 +1,33 @@
+import threading
+import time
+
+import providers
+from isbn_store import ISBNStore
+from lookup_service import LookupService
+
+def test_results_are_saved_while_waiting_for_another_process(tmp_path, monkeypatch):
+    for provider in providers.PROVIDERS:
+        monkeypatch.setitem(providers.BATCH_FETCHERS, provider, lambda isbns: {isbn: "2020" for isbn in isbns})
+    db = str(tmp_path / "isbns.db")
+    json_file = str(tmp_path / "none.json")
+    other = ISBNStore(db, json_file)
+    service = LookupService(ISBNStore(db, json_file))
+    service.engine.poll_interval = 0.05
+    # Otro proceso está buscando el primer ISBN
+    other.claim_lookups(["9780306406157"], "other")
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.extend(service.lookup(["9780306406157", "9788401034787"])), daemon=True,
+    )
+    thread.start()
+    # El otro proceso ve el resultado del segundo ISBN antes de que acabe la consulta
+    deadline = time.monotonic() + 5
+    while other.refresh().get("9788401034787") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert other.get("9788401034787") == "2020"
+    assert thread.is_alive()
+
+    other.put_many({"9780306406157": "2017-09-02"})
+    thread.join(5)
+    assert [result["date"] for result in results] == ["2017-09-02", "2020"]
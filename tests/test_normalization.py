@@ -0,0 +1,22 @@
+import pandas as pd
+
+from normalization import detect_isbn_columns, normalize_isbn, normalize_isbns
+
+def test_ean_without_bookland_prefix_is_not_an_isbn():
+    result = normalize_isbns(pd.Series(["8412345678905", "978-0-306-40615-7", "0306406152"]))
+    assert result["valid"].tolist() == [False, True, True]
+    assert result["canonical"].tolist()[1:] == ["9780306406157", "9780306406157"]
+    assert normalize_isbn("8412345678905") == ("8412345678905", "8412345678905", False)
+    assert normalize_isbn("979-10-90636-07-1")[2]
+
+def test_ean_columns_are_not_detected_as_isbn_columns():
+    df = pd.DataFrame({
+        "EAN": ["8412345678905", "4006381333931", "5012345678900"],
+        "ISBN": ["9780306406157", "9788401034787", None],
+        "Titulo": ["A", "B", "C"],
+    })
+    assert detect_isbn_columns(df) == ["ISBN"]
+
+def test_numeric_isbn_cells_are_detected():
+    df = pd.DataFrame({"ISBN": [9780306406157, None, 9788401034787]}, dtype=object)
+    assert detect_isbn_columns(df) == ["ISBN"]
@@ -0,0 +1,70 @@
+import pytest
+import requests
+
+from provider_client import CircuitBreaker, CircuitOpenError, ProviderClient
+
+class _Response:
+    status_code = 200
+    content = b'{"ok": 1}'
+    headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"ok": 1}
+
+# Cliente cuyo session.get devuelve o lanza, por orden, los elementos de `outcomes`
+def _client(outcomes, cooldown=60.0):
+    client = ProviderClient("test", retries=0, breaker=CircuitBreaker(failure_threshold=1, cooldown=cooldown))
+    outcomes = list(outcomes)
+    calls = []
+
+    def get(url, params=None, timeout=None):
+        calls.append(url)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client.session.get = get
+    return client, calls
+
+@pytest.mark.parametrize("error", [
+    requests.ConnectionError("down"),
+    requests.Timeout("slow"),
+    requests.exceptions.ChunkedEncodingError("cut"),
+    requests.exceptions.ContentDecodingError("gzip"),
+])
+def test_transport_errors_open_the_circuit(error):
+    client, calls = _client([error])
+    with pytest.raises(type(error)):
+        client.get_json("http://provider")
+    with pytest.raises(CircuitOpenError):
+        client.get_json("http://provider")
+    assert len(calls) == 1
+
+def test_failed_probe_reopens_and_next_probe_closes():
+    client, calls = _client([
+        requests.ConnectionError("down"),
+        requests.exceptions.ChunkedEncodingError("cut"),
+        _Response(),
+    ], cooldown=0.0)
+    with pytest.raises(requests.ConnectionError):
+        client.get_json("http://provider")
+    # Pasado el tiempo de espera, la petición de prueba falla con un error de transporte
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get_json("http://provider")
+    assert not client.breaker.probing
+    # La siguiente prueba se hace y, como funciona, el circuito se cierra
+    assert client.get_json("http://provider") == {"ok": 1}
+    assert client.breaker.opened_at is None
+    assert len(calls) == 3
+
+def test_probe_is_exclusive_while_in_flight():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
@@ -0,0 +1,23 @@
+import pytest
+
+from provider_stats import ProviderStats
+
+def test_latency_is_per_isbn_and_per_prefix():
+    stats = ProviderStats()
+    stats.record("a", [f"978840000000{i}" for i in range(4)], (), 2.0)
+    stats.record("a", ["9780000000000"], (), 0.1)
+    assert stats.latency[("a", "97884")] == pytest.approx(0.5)
+    assert stats.latency[("a", "97800")] == pytest.approx(0.1)
+
+def test_only_first_attempts_count_towards_hit_rate():
+    stats = ProviderStats()
+    isbns = ["9780000000001", "9780000000002"]
+    stats.record("b", isbns, {"9780000000001": "2020"}, 1.0, first=["9780000000002"])
+    assert stats.summary()["b"]["lookups"] == 1
+    assert stats.summary()["b"]["hits"] == 0
+
+def test_explore_starts_with_another_provider_sometimes():
+    stats = ProviderStats(explore_ratio=0.5, seed=1)
+    orders = {stats.explore(("a", "b")) for _ in range(50)}
+    assert orders == {("a", "b"), ("b", "a")}
+    assert ProviderStats(explore_ratio=0).explore(("a", "b")) == ("a", "b")